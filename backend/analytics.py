@@ -0,0 +1,154 @@
+"""Batch job computing per-user muscle balance and weekly training trends.
+
+Streams workout events from Mongo in batches, aggregates them with pandas,
+scores every user at once with NumPy and bulk-writes one analytics rollup
+per user ("<user_id>:analytics" in workout_rollups), which the dashboard
+reads in the same lookup as its daily rollups.
+
+    python analytics.py --window-days 28 --weeks 8
+    python analytics.py --every 900   # keep running, refresh every 15 min
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+import pandas as pd
+from pymongo import MongoClient, UpdateOne
+
+from server import MUSCLE_GROUPS, rollup_id
+
+logger = logging.getLogger("analytics")
+
+EVENT_FIELDS = {"_id": 0, "user_id": 1, "muscle_group": 1, "duration_minutes": 1, "performed_at": 1}
+
+
+def stream_batches(collection, since: datetime, batch_size: int):
+    cursor = collection.find({"performed_at": {"$gte": since}}, EVENT_FIELDS).batch_size(batch_size)
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield pd.DataFrame.from_records(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame.from_records(batch)
+
+
+def balance_scores(minutes: pd.DataFrame) -> pd.Series:
+    # Vectorized form of server.muscle_balance_score over a users x groups matrix
+    matrix = minutes.reindex(columns=MUSCLE_GROUPS, fill_value=0).to_numpy(dtype=float)
+    totals = matrix.sum(axis=1, keepdims=True)
+    shares = np.divide(matrix, totals, out=np.zeros_like(matrix), where=totals > 0)
+    uniform = 1 / len(MUSCLE_GROUPS)
+    distance = np.abs(shares - uniform).sum(axis=1) / 2
+    scores = np.rint(100 * (1 - distance / (1 - uniform))).astype(int)
+    scores[totals[:, 0] == 0] = 0
+    return pd.Series(scores, index=minutes.index)
+
+
+def compute(batches, window_start: datetime, weeks: int):
+    muscle_parts, weekly_parts = [], []
+    for frame in batches:
+        performed_at = pd.to_datetime(frame["performed_at"], utc=True)
+        in_window = performed_at >= window_start
+        muscle_parts.append(
+            frame[in_window].groupby(["user_id", "muscle_group"])["duration_minutes"].sum()
+        )
+        # Weeks start on Monday, matching the dashboard's Pzt..Paz labels
+        week = performed_at.dt.tz_localize(None).dt.to_period("W-SUN").dt.start_time
+        weekly_parts.append(frame.groupby([frame["user_id"], week.rename("week")])["duration_minutes"].sum())
+
+    if not weekly_parts:
+        return {}
+
+    # Partial sums per batch are combined once at the end
+    muscle_minutes = pd.concat(muscle_parts).groupby(level=[0, 1]).sum().unstack(fill_value=0)
+    weekly = pd.concat(weekly_parts).groupby(level=[0, 1]).sum().unstack(fill_value=0)
+
+    last_week = pd.Timestamp(datetime.now(timezone.utc).date()).to_period("W-SUN").start_time
+    week_index = pd.date_range(end=last_week, periods=weeks, freq="7D")
+    weekly = weekly.reindex(columns=week_index, fill_value=0)
+
+    users = weekly.index
+    muscle_minutes = muscle_minutes.reindex(index=users, columns=MUSCLE_GROUPS, fill_value=0)
+    scores = balance_scores(muscle_minutes)
+
+    labels = [f"{d.isocalendar().year}-W{d.isocalendar().week:02d}" for d in week_index]
+    weekly_values = weekly.to_numpy(dtype=int)
+    muscle_values = muscle_minutes.to_numpy(dtype=int)
+    return {
+        user_id: {
+            "muscle_balance": int(scores.iloc[i]),
+            "muscle_minutes": dict(zip(MUSCLE_GROUPS, map(int, muscle_values[i]))),
+            "weekly_trend": [{"week": w, "value": int(v)} for w, v in zip(labels, weekly_values[i])],
+        }
+        for i, user_id in enumerate(users)
+    }
+
+
+def write_results(collection, results: dict, window_days: int, batch_size: int, computed_at: datetime) -> int:
+    ops = [
+        UpdateOne(
+            {"_id": rollup_id(user_id, "analytics")},
+            {"$set": {
+                "user_id": user_id,
+                "day": "analytics",
+                "window_days": window_days,
+                "computed_at": computed_at,
+                **values,
+            }},
+            upsert=True
+        )
+        for user_id, values in results.items()
+    ]
+    for start in range(0, len(ops), batch_size):
+        collection.bulk_write(ops[start:start + batch_size], ordered=False)
+    # Users without workouts in this run would otherwise keep their last scores and trend forever;
+    # without the rollup the dashboard falls back to lifetime totals
+    return collection.delete_many({"day": "analytics", "computed_at": {"$lt": computed_at}}).deleted_count
+
+
+def run(db, window_days: int = 28, weeks: int = 8, read_batch: int = 5000, write_batch: int = 1000) -> dict:
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    window_start = now - timedelta(days=window_days)
+    # Weekly trend needs the full span of weeks, the balance only the window
+    since = min(window_start, now - timedelta(weeks=weeks))
+
+    results = compute(stream_batches(db.workouts, since, read_batch), window_start, weeks)
+    removed = write_results(db.workout_rollups, results, window_days, write_batch, now)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "users": len(results),
+        "removed": removed,
+        "seconds": round(elapsed, 3),
+        "users_per_second": round(len(results) / elapsed, 1) if elapsed else 0.0,
+    }
+    logger.info("Analytics refreshed for %(users)d users in %(seconds)ss (%(users_per_second)s users/sec), "
+                "%(removed)d stale rollups removed", report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--window-days", type=int, default=28, help="days of history used for muscle balance")
+    parser.add_argument("--weeks", type=int, default=8, help="number of weeks in the weekly trend")
+    parser.add_argument("--read-batch", type=int, default=5000, help="workout events per read batch")
+    parser.add_argument("--write-batch", type=int, default=1000, help="users per bulk write")
+    parser.add_argument("--every", type=float, default=0, help="repeat every N seconds instead of running once")
+    args = parser.parse_args()
+
+    db = MongoClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+    while True:
+        run(db, args.window_days, args.weeks, args.read_batch, args.write_batch)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Micro-benchmark of the JSON response path for 100-item list responses.
+
+Compares the old path (re-validating Mongo documents through the Pydantic
+models, converting ISO strings back to datetimes and encoding with
+jsonable_encoder + json.dumps) with the current one (trusted documents
+serialized directly by orjson), reporting CPU time per request.
+
+    python bench_json.py --items 100 --rounds 2000
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from server import (
+    BLOG_POST_LIST_FIELDS, SEED_DATA_DIR, Exercise, iter_records, render_json
+)
+
+
+def legacy_render(content):
+    # The encoding render_json used before orjson
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def sample_documents(name: str, items: int) -> list:
+    with open(SEED_DATA_DIR / f"{name}.ndjson", "rb") as f:
+        records = list(iter_records(f))
+    return [{**records[i % len(records)], "id": f"{name}-{i}"} for i in range(items)]
+
+
+def cpu_per_request(func, rounds: int) -> float:
+    func()
+    started = time.process_time()
+    for _ in range(rounds):
+        func()
+    return (time.process_time() - started) / rounds
+
+
+def run(items: int = 100, rounds: int = 2000) -> dict:
+    now = datetime.now(timezone.utc)
+    exercises = sample_documents("exercises", items)
+    posts = [
+        {**{f: post.get(f) for f in BLOG_POST_LIST_FIELDS}, "published_at": now - timedelta(days=i)}
+        for i, post in enumerate(sample_documents("blog_posts", items))
+    ]
+    legacy_posts = [{**post, "published_at": post["published_at"].isoformat()} for post in posts]
+
+    def exercises_before():
+        return legacy_render([Exercise(**e) for e in exercises])
+
+    def exercises_after():
+        return render_json(exercises)
+
+    def posts_before():
+        return legacy_render([
+            {**post, "published_at": datetime.fromisoformat(post["published_at"])} for post in legacy_posts
+        ])
+
+    def posts_after():
+        return render_json(posts)
+
+    report = {"items": items, "rounds": rounds}
+    for name, before, after in [("exercises", exercises_before, exercises_after),
+                                ("blog_posts", posts_before, posts_after)]:
+        before_us = 1e6 * cpu_per_request(before, rounds)
+        after_us = 1e6 * cpu_per_request(after, rounds)
+        report[name] = {
+            "before_us": round(before_us, 1),
+            "after_us": round(after_us, 1),
+            "speedup": round(before_us / after_us, 2),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100, help="documents per list response")
+    parser.add_argument("--rounds", type=int, default=2000, help="responses rendered per measurement")
+    args = parser.parse_args()
+    print(json.dumps(run(args.items, args.rounds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
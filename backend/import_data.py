@@ -0,0 +1,39 @@
+"""Import exercises or blog posts from JSON / NDJSON files.
+
+Records are upserted in batches keyed by a stable id derived from their
+natural key (exercise name, post title), so re-running an import never
+changes ids or empties the live collection.
+
+    python import_data.py exercises exercises.ndjson --batch-size 1000
+    python import_data.py blog_posts posts.json --prune
+"""
+import argparse
+import asyncio
+import json
+
+import server
+
+
+async def run(args):
+    try:
+        # Only bumps cache_versions; the API workers drop their caches and rebuild search through the change feed
+        report = await server.import_file(args.collection, args.path, args.batch_size, args.prune, local=False)
+    finally:
+        server.client.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("collection", choices=sorted(server.IMPORT_SPECS))
+    parser.add_argument("path", help="JSON array or NDJSON file")
+    parser.add_argument("--batch-size", type=int, default=500, help="documents per bulk write")
+    parser.add_argument("--prune", action="store_true",
+                        help="delete documents that are not in this file (skipped if any record is invalid)")
+    report = asyncio.run(run(parser.parse_args()))
+    raise SystemExit(1 if report["invalid"] else 0)
+
+
+if __name__ == "__main__":
+    main()
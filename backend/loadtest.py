@@ -0,0 +1,385 @@
+"""Load and benchmark harness for the API.
+
+Drives concurrent virtual users through named scenarios and writes a JSON
+report with throughput and p50/p95/p99 latency per endpoint, so runs on
+different commits can be compared. By default the app runs in-process
+against mongomock, with no network or database required; point it at a
+local mongod with --mongo-url, or at a running server with --base-url.
+
+    python loadtest.py --scenario all --concurrency 20 --duration 15 --output report.json
+    python loadtest.py --mongo-url mongodb://localhost:27017 --scenario login_storm
+    python loadtest.py --base-url http://localhost:8001 --scenario blog_browsing
+    python loadtest.py --baseline main.json --tolerance 0.2   # exit 1 on p95 regressions
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import httpx
+
+logger = logging.getLogger("loadtest")
+
+PASSWORD = "loadtest-password"
+
+
+class Recorder:
+    """Collects one latency sample and status per request, keyed by endpoint label."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+
+    async def request(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as exc:
+            self.latencies[endpoint].append(time.perf_counter() - started)
+            self.statuses[endpoint][type(exc).__name__] += 1
+            self.errors[endpoint] += 1
+            return None
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        self.statuses[endpoint][str(response.status_code)] += 1
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+        return response
+
+
+def percentile(ordered: list, q: float) -> float:
+    # Nearest-rank, so every reported value is a latency that was actually observed
+    index = max(0, min(len(ordered) - 1, int(-(-q * len(ordered) // 100)) - 1))
+    return ordered[index]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.latencies.items()):
+        ordered = sorted(samples)
+        endpoints[endpoint] = {
+            "requests": len(ordered),
+            "errors": recorder.errors[endpoint],
+            "statuses": dict(recorder.statuses[endpoint]),
+            "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": round(1000 * sum(ordered) / len(ordered), 3),
+            "p50_ms": round(1000 * percentile(ordered, 50), 3),
+            "p95_ms": round(1000 * percentile(ordered, 95), 3),
+            "p99_ms": round(1000 * percentile(ordered, 99), 3),
+            "max_ms": round(1000 * ordered[-1], 3),
+        }
+    return endpoints
+
+
+# Scenarios
+# Each scenario has a setup run once before timing starts and a step each
+# virtual user repeats until the run ends. Setup goes through the public API
+# so the same scenario works in-process and against a remote server.
+
+async def signup(client: httpx.AsyncClient, email: str) -> dict:
+    while True:
+        response = await client.post("/api/auth/signup", json={
+            "email": email, "password": PASSWORD, "full_name": "Load Test"
+        })
+        # Setup signs many users up at once; on small machines the password pool sheds some of them
+        if response.status_code != 503:
+            break
+        await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+    if response.status_code == 400:
+        response = await client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()
+
+
+class LoginStorm:
+    """Many users logging in at once: bcrypt pool, rate limiter and user lookups."""
+
+    name = "login_storm"
+
+    def __init__(self, users: int, run_id: str):
+        self.emails = [f"load-{run_id}-{i}@example.com" for i in range(users)]
+
+    async def setup(self, client: httpx.AsyncClient):
+        await asyncio.gather(*(signup(client, email) for email in self.emails))
+
+    async def step(self, client: httpx.AsyncClient, recorder: Recorder, state: dict):
+        await recorder.request(client, "POST /api/auth/login", "POST", "/api/auth/login", json={
+            "email": random.choice(self.emails), "password": PASSWORD
+        })
+
+
+class BlogBrowsing:
+    """Readers paging through the blog list and opening posts, revalidating with ETags."""
+
+    name = "blog_browsing"
+    pages = 3
+
+    async def setup(self, client: httpx.AsyncClient):
+        pass
+
+    async def step(self, client: httpx.AsyncClient, recorder: Recorder, state: dict):
+        etags = state.setdefault("etags", {})
+        cursor, posts = None, []
+        for _ in range(self.pages):
+            params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+            key = cursor or ""
+            headers = {"If-None-Match": etags[key]} if key in etags else {}
+            response = await recorder.request(
+                client, "GET /api/blog/posts", "GET", "/api/blog/posts", params=params, headers=headers
+            )
+            if response is None or response.status_code not in (200, 304):
+                return
+            if response.status_code == 200:
+                etags[key] = response.headers.get("ETag")
+                state.setdefault("pages", {})[key] = (response.json(), response.headers.get("X-Next-Cursor"))
+            page, cursor = state["pages"][key]
+            posts.extend(page)
+            if not cursor:
+                break
+        if posts:
+            await recorder.request(
+                client, "GET /api/blog/post/{post_id}", "GET", f"/api/blog/post/{random.choice(posts)['id']}"
+            )
+
+
+class MuscleFilter:
+    """Subscribed users filtering exercises by muscle group on the anatomy screen."""
+
+    name = "muscle_filter"
+
+    def __init__(self, run_id: str):
+        self.email = f"load-{run_id}-anatomy@example.com"
+        self.headers = {}
+        self.muscle_groups = []
+
+    async def setup(self, client: httpx.AsyncClient):
+        session = await signup(client, self.email)
+        headers = {"Authorization": f"Bearer {session['access_token']}"}
+
+        plans = (await client.get("/api/subscriptions/plans")).json()
+        plan = min((p for p in plans if p["has_anatomy"]), key=lambda p: p["price"])
+        response = await client.post("/api/subscriptions/activate", headers={
+            **headers, "Idempotency-Key": uuid.uuid4().hex
+        }, json={
+            "plan_name": plan["name"], "card_number": "4242 4242 4242 4242",
+            "card_name": "Load Test", "expiry": "12/30", "cvv": "123"
+        })
+        payment = response.raise_for_status().json()
+        while payment["status"] not in ("succeeded", "failed"):
+            await asyncio.sleep(0.1)
+            response = await client.get(f"/api/subscriptions/payments/{payment['payment_id']}", headers=headers)
+            payment = response.raise_for_status().json()
+        if payment["status"] == "failed":
+            raise RuntimeError("subscription payment failed during setup")
+
+        response = await client.post("/api/auth/refresh", json={"refresh_token": session["refresh_token"]})
+        session = response.raise_for_status().json()
+        self.headers = {"Authorization": f"Bearer {session['access_token']}"}
+
+        groups, cursor = set(), None
+        while True:
+            params = {"limit": 200, "fields": "muscle_group", **({"cursor": cursor} if cursor else {})}
+            response = await client.get("/api/exercises", params=params, headers=self.headers)
+            groups.update(e["muscle_group"] for e in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        self.muscle_groups = sorted(groups)
+        if not self.muscle_groups:
+            raise RuntimeError("no exercises found; seed the catalogue first")
+
+    async def step(self, client: httpx.AsyncClient, recorder: Recorder, state: dict):
+        await recorder.request(
+            client, "GET /api/exercises/by-muscle/{muscle_group}", "GET",
+            f"/api/exercises/by-muscle/{random.choice(self.muscle_groups)}", headers=self.headers
+        )
+
+
+def build_scenarios(names: list, args, run_id: str) -> list:
+    available = {
+        LoginStorm.name: lambda: LoginStorm(args.users, run_id),
+        BlogBrowsing.name: BlogBrowsing,
+        MuscleFilter.name: lambda: MuscleFilter(run_id),
+    }
+    if "all" in names:
+        names = list(available)
+    return [available[name]() for name in names]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario, concurrency: int, duration: float,
+                       iterations: int) -> dict:
+    await scenario.setup(client)
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user():
+        state = {}
+        done = 0
+        while (iterations and done < iterations) or (not iterations and time.perf_counter() < deadline):
+            await scenario.step(client, recorder, state)
+            done += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    endpoints = summarize(recorder, elapsed)
+    total = sum(e["requests"] for e in endpoints.values())
+    logger.info("%s: %d requests in %.1fs (%.1f req/s)", scenario.name, total, elapsed, total / elapsed)
+    return {
+        "seconds": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+# Targets
+@asynccontextmanager
+async def in_process_client(mongo_url: str, db_name: str, relax_rate_limits: bool):
+    """Imports the app with its startup hooks run and serves it over an ASGI transport."""
+    if mongo_url:
+        os.environ['MONGO_URL'] = mongo_url
+    else:
+        # Optional: only needed for the default in-memory stand-in
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        motor.motor_asyncio.AsyncIOMotorClient = AsyncMongoMockClient
+        os.environ['MONGO_URL'] = "mongodb://localhost:27017"
+        # mongomock has no change streams and does not answer the topology check
+        os.environ['CHANGE_FEED_MODE'] = "poll"
+    os.environ['DB_NAME'] = db_name
+    os.environ.setdefault('JWT_SECRET', uuid.uuid4().hex)
+    os.environ.setdefault('ADMIN_TOKEN', uuid.uuid4().hex)
+    if relax_rate_limits:
+        # Everything arrives from one address, so production limits would turn the storm into 429s
+        os.environ['AUTH_RATE_LIMIT_IP'] = "1000000/60"
+        os.environ['AUTH_RATE_LIMIT_EMAIL'] = "1000000/60"
+
+    import server
+
+    async with server.app.router.lifespan_context(server.app):
+        transport = httpx.ASGITransport(app=server.app, client=("127.0.0.1", 50000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            yield client
+
+
+@asynccontextmanager
+async def remote_client(base_url: str, timeout: float):
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        yield client
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def run(args) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    scenarios = build_scenarios(args.scenario, args, run_id)
+    if args.base_url:
+        target = {"mode": "remote", "base_url": args.base_url}
+        client_context = remote_client(args.base_url, args.timeout)
+    else:
+        target = {"mode": "in-process", "mongo": args.mongo_url or "mongomock", "db": args.db_name}
+        client_context = in_process_client(args.mongo_url, args.db_name, not args.keep_rate_limits)
+
+    async with client_context as client:
+        if args.seed:
+            admin_token = args.admin_token or os.environ.get('ADMIN_TOKEN', '')
+            (await client.post("/api/seed-data", headers={"Authorization": f"Bearer {admin_token}"})).raise_for_status()
+        results = {}
+        for scenario in scenarios:
+            results[scenario.name] = await run_scenario(
+                client, scenario, args.concurrency, args.duration, args.iterations
+            )
+
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "target": target,
+        "concurrency": args.concurrency,
+        "duration_seconds": args.duration,
+        "iterations": args.iterations,
+        "scenarios": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Lists endpoints whose p95 grew by more than `tolerance` (a fraction) over the baseline."""
+    regressions = []
+    for name, scenario in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name, {}).get("endpoints", {})
+        for endpoint, stats in scenario["endpoints"].items():
+            if endpoint not in before or not before[endpoint]["p95_ms"]:
+                continue
+            change = stats["p95_ms"] / before[endpoint]["p95_ms"] - 1
+            logger.info("%s %s: p95 %.2fms -> %.2fms (%+.0f%%)", name, endpoint,
+                        before[endpoint]["p95_ms"], stats["p95_ms"], 100 * change)
+            if change > tolerance:
+                regressions.append({"scenario": name, "endpoint": endpoint, "p95_change": round(change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", nargs="+", default=["all"],
+                        choices=["all", LoginStorm.name, BlogBrowsing.name, MuscleFilter.name])
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual users per scenario")
+    parser.add_argument("--duration", type=float, default=10, help="seconds each scenario runs")
+    parser.add_argument("--iterations", type=int, default=0,
+                        help="steps per virtual user instead of a fixed duration")
+    parser.add_argument("--users", type=int, default=20, help="accounts created for the login storm")
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--timeout", type=float, default=30, help="request timeout against --base-url")
+    parser.add_argument("--mongo-url", help="in-process app against this mongod instead of mongomock")
+    parser.add_argument("--db-name", default="byklab_loadtest", help="database used by the in-process app")
+    parser.add_argument("--keep-rate-limits", action="store_true",
+                        help="keep the configured auth rate limits for the in-process app")
+    parser.add_argument("--no-seed", dest="seed", action="store_false", help="skip POST /api/seed-data")
+    parser.add_argument("--admin-token", help="ADMIN_TOKEN of the --base-url server, used for seeding")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="previous report to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed p95 growth over the baseline before failing (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    report = asyncio.run(run(args))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+
+    body = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(body + "\n")
+    else:
+        print(body)
+
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Object storage for exercise media: presigned URLs, rendition discovery and selection.
+
+Renditions are produced ahead of time by the transcoding pipeline and
+uploaded as "<prefix><asset_id>/<label>.<ext>". Each object carries its
+dimensions as S3 user metadata (width, height), plus duration and bitrate
+(duration, bitrate-kbps) for video and the original link (source-url).
+Nothing here transcodes; it only reads that layout and signs URLs.
+
+Any S3-compatible endpoint works, so a local MinIO or `moto_server` can
+stand in for S3 in development and tests (MEDIA_S3_ENDPOINT_URL).
+"""
+from typing import Iterable, List, Optional
+
+import boto3
+from botocore.config import Config
+
+
+class MediaStorage:
+    """Thin wrapper around a boto3 S3 client scoped to one bucket and key prefix."""
+
+    def __init__(self, bucket: str, prefix: str = "media/", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, url_ttl: int = 3600):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_ttl = url_ttl
+        self.client = boto3.client(
+            "s3", endpoint_url=endpoint_url, region_name=region,
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path" if endpoint_url else "auto"})
+        )
+
+    def presign(self, key: str) -> str:
+        # Signing is local HMAC work, no request is made
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=self.url_ttl
+        )
+
+    def scan(self) -> dict:
+        """Lists every rendition under the prefix, grouped by asset id. Blocking; run it in a thread."""
+        assets = {}
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get("Contents", []):
+                asset_id, _, name = obj["Key"][len(self.prefix):].partition("/")
+                if not asset_id or not name:
+                    continue
+                head = self.client.head_object(Bucket=self.bucket, Key=obj["Key"])
+                meta = head.get("Metadata", {})
+                asset = assets.setdefault(asset_id, {"renditions": []})
+                if meta.get("duration"):
+                    asset["duration_seconds"] = float(meta["duration"])
+                if meta.get("source-url"):
+                    asset["source_url"] = meta["source-url"]
+                asset["renditions"].append({
+                    "label": name.rsplit(".", 1)[0],
+                    "key": obj["Key"],
+                    "content_type": head.get("ContentType", "application/octet-stream"),
+                    "width": int(meta.get("width", 0)),
+                    "height": int(meta.get("height", 0)),
+                    "bytes": obj["Size"],
+                    "bitrate_kbps": int(meta["bitrate-kbps"]) if meta.get("bitrate-kbps") else None,
+                })
+        for asset in assets.values():
+            asset["renditions"].sort(key=lambda r: (r["width"], r["height"], r["bytes"]))
+        return assets
+
+
+def smallest_covering(renditions: Iterable[dict], width: int) -> Optional[dict]:
+    """Smallest image at least `width` pixels wide, or the widest one if none is."""
+    ordered = sorted(renditions, key=lambda r: (r["width"], r["bytes"]))
+    if not ordered:
+        return None
+    return next((r for r in ordered if r["width"] >= width), ordered[-1])
+
+
+def best_fitting(renditions: Iterable[dict], max_height: Optional[int] = None,
+                 bandwidth_kbps: Optional[int] = None) -> Optional[dict]:
+    """Highest quality video within the screen height and bandwidth, or the lightest one if none fits."""
+    ordered: List[dict] = sorted(renditions, key=lambda r: (r["height"], r.get("bitrate_kbps") or 0))
+    if not ordered:
+        return None
+    fitting = [
+        r for r in ordered
+        if (not max_height or r["height"] <= max_height)
+        # Leave headroom so playback does not stall when throughput dips
+        and (not bandwidth_kbps or (r.get("bitrate_kbps") or 0) <= bandwidth_kbps * 0.8)
+    ]
+    return fitting[-1] if fitting else ordered[0]
@@ -0,0 +1,258 @@
+"""Per-request profiling: where the time of one slow request went.
+
+A RequestTrace is bound to the request through a context variable, so the
+instrumented code (the Mongo command listener, the password pool, JSON
+rendering, compression and the route handler) adds spans to it without
+passing it around. Motor copies the context into its executor threads, so
+command listeners see the trace of the request that issued the command.
+Without a trace bound, each hook costs a single ContextVar lookup.
+
+ProfilerMiddleware decides which requests are traced and keeps the slow or
+explicitly requested ones in a TraceBuffer.
+"""
+import asyncio
+import functools
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+
+current_trace: ContextVar = ContextVar("current_trace", default=None)
+
+MAX_SPANS = 500
+
+
+class RequestTrace:
+    """Spans and phase marks of one request; spans may be added from executor threads."""
+
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.route = None
+        self.status = None
+        self.started_at = datetime.now(timezone.utc)
+        self.total = None
+        self.spans = []
+        self.dropped = 0
+        self.marks = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, detail: str = "", start: Optional[float] = None):
+        if self.total is not None:
+            # Background tasks started by the request inherit its context; they do not belong to it
+            return
+        start = (time.perf_counter() - seconds) if start is None else start
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append((name, detail, start - self._started, seconds))
+            else:
+                self.dropped += 1
+
+    @contextmanager
+    def span(self, name: str, detail: str = ""):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, detail, start)
+
+    def mark(self, name: str):
+        self.marks[name] = time.perf_counter() - self._started
+
+    def finish(self, status: int, route: Optional[str]) -> float:
+        self.status = status
+        self.route = route
+        self.total = time.perf_counter() - self._started
+        return self.total
+
+    def phases(self) -> dict:
+        # Handler = request validation and dependencies, the endpoint, then response validation and rendering
+        marks = self.marks
+        if "handler_end" not in marks:
+            # No route matched
+            return {}
+        if "endpoint_end" not in marks:
+            # Rejected before the endpoint ran, e.g. by validation or a dependency
+            return {"handler": round(1000 * (marks["handler_end"] - marks["handler_start"]), 3)}
+        phases = {
+            "request_validation": marks["endpoint_start"] - marks["handler_start"],
+            "endpoint": marks["endpoint_end"] - marks["endpoint_start"],
+            "response_serialization": marks["handler_end"] - marks["endpoint_end"],
+        }
+        phases["middleware_and_send"] = self.total - (marks["handler_end"] - marks["handler_start"])
+        return {name: round(1000 * seconds, 3) for name, seconds in phases.items()}
+
+    def summary(self) -> dict:
+        # Span totals overlap the phases they ran in, and each other when commands run concurrently
+        time_in = defaultdict(float)
+        with self._lock:
+            for name, _, _, seconds in self.spans:
+                time_in[name] += seconds
+        return {
+            "id": self.id,
+            "started_at": self.started_at,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "trigger": self.trigger,
+            "total_ms": round(1000 * self.total, 3),
+            "time_in_ms": {name: round(1000 * seconds, 3) for name, seconds in sorted(time_in.items())},
+        }
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s[2])
+        return {
+            **self.summary(),
+            "phases_ms": self.phases(),
+            "spans": [
+                {"name": name, "detail": detail, "start_ms": round(1000 * start, 3), "duration_ms": round(1000 * seconds, 3)}
+                for name, detail, start, seconds in spans
+            ],
+            "dropped_spans": self.dropped,
+        }
+
+
+class _NoSpan:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+def profile_span(name: str, detail: str = ""):
+    trace = current_trace.get()
+    return trace.span(name, detail) if trace is not None else NO_SPAN
+
+
+def record_span(name: str, seconds: float, detail: str = ""):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds, detail)
+
+
+class TraceBuffer:
+    """The last `size` kept traces, oldest first."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._traces = deque(maxlen=size)
+        self.kept = 0
+
+    def add(self, trace: RequestTrace):
+        self._traces.append(trace)
+        self.kept += 1
+
+    def get(self, trace_id: str) -> Optional[RequestTrace]:
+        return next((t for t in self._traces if t.id == trace_id), None)
+
+    def list(self, route: Optional[str] = None, min_ms: float = 0, limit: int = 50) -> list:
+        matching = [
+            t for t in reversed(self._traces)
+            if (route is None or t.route == route) and 1000 * t.total >= min_ms
+        ]
+        return [t.summary() for t in matching[:limit]]
+
+
+class ProfiledRoute(APIRoute):
+    """Marks where the handler and the endpoint start and end, which splits a trace into phases."""
+
+    def get_route_handler(self):
+        call = self.dependant.call
+        if asyncio.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def timed_endpoint(*args, **kwargs):
+                trace = current_trace.get()
+                if trace is None:
+                    return await call(*args, **kwargs)
+                trace.mark("endpoint_start")
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    trace.mark("endpoint_end")
+
+            self.dependant.call = timed_endpoint
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            trace = current_trace.get()
+            if trace is None:
+                return await handler(request)
+            trace.mark("handler_start")
+            try:
+                return await handler(request)
+            finally:
+                trace.mark("handler_end")
+
+        return timed_handler
+
+
+class ProfilerMiddleware:
+    """Traces requests that ask for it, a random sample, or all of them when a latency threshold is set.
+
+    The header only counts when `authorize` accepts its value, so clients
+    cannot force traces. Requested and sampled traces are always kept, and a
+    requested one returns its id in X-Profile-Id; threshold traces are kept
+    only when the request was slow.
+    """
+
+    def __init__(self, app, buffer: TraceBuffer, authorize: Callable[[str], bool],
+                 sample_rate: float = 0.0, slow_ms: float = 0.0, header: str = "x-profile"):
+        self.app = app
+        self.buffer = buffer
+        self.authorize = authorize
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.header = header.lower().encode("latin-1")
+
+    def trigger(self, scope) -> Optional[str]:
+        value = next((v for name, v in scope["headers"] if name == self.header), None)
+        if value is not None and self.authorize(value.decode("latin-1")):
+            return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        if self.slow_ms:
+            return "slow"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        trigger = self.trigger(scope) if scope["type"] == "http" else None
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"], trigger)
+        status = {"code": 500}
+
+        async def traced_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if trigger == "header":
+                    MutableHeaders(raw=message["headers"])["X-Profile-Id"] = trace.id
+            await send(message)
+
+        token = current_trace.set(trace)
+        try:
+            await self.app(scope, receive, traced_send)
+        finally:
+            current_trace.reset(token)
+            route = scope.get("route")
+            total = trace.finish(status["code"], route.path if route else None)
+            if trigger != "slow" or 1000 * total >= self.slow_ms:
+                self.buffer.add(trace)
@@ -0,0 +1,242 @@
+"""Batch job precomputing per-user exercise recommendations.
+
+Builds a feature vector per exercise (muscle group one-hot and difficulty)
+and a profile per user from recent workouts: how far each muscle group lags
+an even split, the difficulty level to train at, and how often each exercise
+was done already. Users are scored against the whole catalogue in chunks,
+with matrix products, and the top candidates of each user are written to
+recommendations, together with a "_default" list for users without history.
+The API re-ranks those candidates per request (see server.rerank).
+
+    python recommendations.py --window-days 28 --candidates 50
+    python recommendations.py --every 3600   # keep running, refresh hourly
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+import pandas as pd
+from pymongo import MongoClient, ReplaceOne
+
+from server import DEFAULT_RECOMMENDATIONS_ID, DIFFICULTY_LEVELS, MUSCLE_GROUPS
+
+logger = logging.getLogger("recommendations")
+
+EVENT_FIELDS = {"_id": 0, "user_id": 1, "exercise_id": 1, "muscle_group": 1, "duration_minutes": 1}
+
+# Weights of the three score terms; each term lies in [0, 1]
+GAP_WEIGHT = 0.5
+LEVEL_WEIGHT = 0.35
+NOVELTY_WEIGHT = 0.15
+
+# A user's level moves this far above what they already train, and repeats count
+# fully against an exercise after this many sessions in the window
+LEVEL_STEP = 0.25
+REPEAT_SATURATION = 3
+# Minutes in the window at which a user without exercise-linked workouts counts as advanced
+ADVANCED_MINUTES = 1200
+
+
+class ItemFeatures:
+    """Exercise feature vectors: rows follow `ids`, muscle one-hot in MUSCLE_GROUPS order."""
+
+    def __init__(self, exercises: list):
+        known = [e for e in exercises if e.get("muscle_group") in MUSCLE_GROUPS]
+        self.ids = np.array([e["id"] for e in known])
+        self.position = {exercise_id: i for i, exercise_id in enumerate(self.ids)}
+        self.muscle_groups = [e["muscle_group"] for e in known]
+        self.difficulty_labels = [e.get("difficulty") for e in known]
+        groups = np.array([MUSCLE_GROUPS.index(g) for g in self.muscle_groups], dtype=int)
+        self.muscles = np.zeros((len(known), len(MUSCLE_GROUPS)))
+        self.muscles[np.arange(len(known)), groups] = 1.0
+        self.difficulty = np.array([DIFFICULTY_LEVELS.get(d, 0.5) for d in self.difficulty_labels])
+
+
+def load_profiles(collection, since: datetime, items: ItemFeatures, batch_size: int):
+    """Per-user muscle minutes and exercise session counts, aggregated batch by batch."""
+    muscle_parts, session_parts = [], []
+    batch = []
+
+    def aggregate(frame: pd.DataFrame):
+        muscle_parts.append(frame.groupby(["user_id", "muscle_group"])["duration_minutes"].sum())
+        linked = frame[frame["exercise_id"].isin(items.position)]
+        session_parts.append(linked.groupby(["user_id", "exercise_id"]).size())
+
+    cursor = collection.find({"performed_at": {"$gte": since}}, EVENT_FIELDS).batch_size(batch_size)
+    for doc in cursor:
+        batch.append({"exercise_id": None, **doc})
+        if len(batch) >= batch_size:
+            aggregate(pd.DataFrame.from_records(batch))
+            batch = []
+    if batch:
+        aggregate(pd.DataFrame.from_records(batch))
+    if not muscle_parts:
+        return [], np.zeros((0, len(MUSCLE_GROUPS))), np.zeros((0, len(items.ids)))
+
+    muscle_minutes = pd.concat(muscle_parts).groupby(level=[0, 1]).sum().unstack(fill_value=0)
+    muscle_minutes = muscle_minutes.reindex(columns=MUSCLE_GROUPS, fill_value=0)
+    users = list(muscle_minutes.index)
+
+    sessions = np.zeros((len(users), len(items.ids)))
+    counts = pd.concat(session_parts).groupby(level=[0, 1]).sum()
+    if len(counts):
+        row = {user_id: i for i, user_id in enumerate(users)}
+        rows = [row[u] for u in counts.index.get_level_values(0)]
+        cols = [items.position[e] for e in counts.index.get_level_values(1)]
+        sessions[rows, cols] = counts.to_numpy()
+    return users, muscle_minutes.to_numpy(dtype=float), sessions
+
+
+def user_levels(minutes: np.ndarray, sessions: np.ndarray, items: ItemFeatures) -> np.ndarray:
+    # Average difficulty of what they do, one step up; volume alone when no workout names an exercise
+    done = sessions.sum(axis=1)
+    by_exercise = np.divide(sessions @ items.difficulty, done, out=np.zeros(len(done)), where=done > 0)
+    by_volume = np.clip(minutes.sum(axis=1) / ADVANCED_MINUTES, 0, 1)
+    return np.clip(np.where(done > 0, by_exercise + LEVEL_STEP, by_volume), 0, 1)
+
+
+def muscle_gaps(minutes: np.ndarray) -> np.ndarray:
+    # 1 for an untrained group, 0 for a group at or above its even share
+    totals = minutes.sum(axis=1, keepdims=True)
+    shares = np.divide(minutes, totals, out=np.zeros_like(minutes), where=totals > 0)
+    uniform = 1 / len(MUSCLE_GROUPS)
+    return np.clip((uniform - shares) / uniform, 0, 1)
+
+
+def score(gaps: np.ndarray, levels: np.ndarray, sessions: np.ndarray, items: ItemFeatures):
+    gap_term = gaps @ items.muscles.T
+    level_term = 1 - np.abs(levels[:, None] - items.difficulty[None, :])
+    novelty_term = 1 - np.minimum(sessions / REPEAT_SATURATION, 1)
+    total = GAP_WEIGHT * gap_term + LEVEL_WEIGHT * level_term + NOVELTY_WEIGHT * novelty_term
+    return total, gap_term, level_term, novelty_term
+
+
+def top_candidates(total: np.ndarray, k: int, items: ItemFeatures) -> np.ndarray:
+    """Rows of item positions, best first, with the best of every muscle group represented.
+
+    Taking the top k/groups per group keeps the stored list diverse enough for the
+    serving re-rank, which caps each group's share; ties keep catalogue order.
+    """
+    per_group = -(-k // len(MUSCLE_GROUPS))
+    picks = []
+    for g in range(len(MUSCLE_GROUPS)):
+        columns = np.flatnonzero(items.muscles[:, g])
+        if len(columns):
+            order = np.argsort(-total[:, columns], axis=1, kind="stable")[:, :per_group]
+            picks.append(columns[order])
+    chosen = np.concatenate(picks, axis=1)
+    order = np.argsort(-np.take_along_axis(total, chosen, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(chosen, order, axis=1)
+
+
+def candidate_lists(users, gaps, levels, sessions, items: ItemFeatures, k: int):
+    total, gap_term, level_term, novelty_term = score(gaps, levels, sessions, items)
+    for i, top in enumerate(top_candidates(total, k, items)):
+        yield users[i], float(levels[i]), gaps[i], [
+            {
+                "exercise_id": str(items.ids[j]),
+                "muscle_group": items.muscle_groups[j],
+                "difficulty": items.difficulty_labels[j],
+                "score": round(float(total[i, j]), 4),
+                "reasons": [
+                    reason for reason, applies in (
+                        ("muscle_gap", gap_term[i, j] >= 0.5),
+                        ("level_match", level_term[i, j] >= 0.75),
+                        ("new", novelty_term[i, j] == 1),
+                    ) if applies
+                ],
+            }
+            for j in top
+        ]
+
+
+def run(db, window_days: int = 28, candidates: int = 50, chunk_size: int = 2000,
+        read_batch: int = 5000, write_batch: int = 1000) -> dict:
+    started = time.perf_counter()
+    computed_at = datetime.now(timezone.utc)
+    items = ItemFeatures(list(db.exercises.find({}, {"_id": 0, "id": 1, "muscle_group": 1, "difficulty": 1})))
+    if not len(items.ids):
+        logger.warning("No exercises to recommend; keeping the previous recommendations")
+        return {"users": 0, "exercises": 0, "removed": 0, "seconds": 0.0, "users_per_second": 0.0}
+
+    users, minutes, sessions = load_profiles(
+        db.workouts, computed_at - timedelta(days=window_days), items, read_batch
+    )
+    levels = user_levels(minutes, sessions, items)
+    gaps = muscle_gaps(minutes)
+
+    # Users without history: every group counts as a gap, beginner level, nothing done yet
+    default = ([DEFAULT_RECOMMENDATIONS_ID], np.ones((1, len(MUSCLE_GROUPS))), np.zeros(1),
+               np.zeros((1, len(items.ids))))
+
+    ops, written = [], 0
+
+    def flush():
+        nonlocal ops, written
+        if ops:
+            db.recommendations.bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+
+    # Chunks bound the users x exercises score matrices
+    chunks = [default] + [
+        (users[s:s + chunk_size], gaps[s:s + chunk_size], levels[s:s + chunk_size], sessions[s:s + chunk_size])
+        for s in range(0, len(users), chunk_size)
+    ]
+    for chunk_users, chunk_gaps, chunk_levels, chunk_sessions in chunks:
+        for user_id, level, user_gaps, ranked in candidate_lists(
+            chunk_users, chunk_gaps, chunk_levels, chunk_sessions, items, candidates
+        ):
+            ops.append(ReplaceOne({"_id": user_id}, {
+                "user_id": user_id,
+                "level": round(level, 3),
+                "gaps": {group: round(float(g), 3) for group, g in zip(MUSCLE_GROUPS, user_gaps)},
+                "candidates": ranked,
+                "window_days": window_days,
+                "computed_at": computed_at,
+            }, upsert=True))
+            if len(ops) >= write_batch:
+                flush()
+    flush()
+    # Users without workouts in the window drop back to the "_default" list instead of
+    # being re-ranked against their last run's candidates forever
+    removed = db.recommendations.delete_many({"computed_at": {"$lt": computed_at}}).deleted_count
+    # Tells the API workers to drop cached recommendations (see server.ChangeFeed)
+    db.cache_versions.update_one({"_id": "recommendations"}, {"$inc": {"version": 1}}, upsert=True)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "users": len(users),
+        "exercises": len(items.ids),
+        "removed": removed,
+        "seconds": round(elapsed, 3),
+        "users_per_second": round(len(users) / elapsed, 1) if elapsed else 0.0,
+    }
+    logger.info("Recommendations refreshed for %(users)d users over %(exercises)d exercises "
+                "in %(seconds)ss (%(users_per_second)s users/sec), %(removed)d stale lists removed", report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--window-days", type=int, default=28, help="days of workout history considered")
+    parser.add_argument("--candidates", type=int, default=50, help="candidates stored per user")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="users scored per matrix product")
+    parser.add_argument("--read-batch", type=int, default=5000, help="workout events per read batch")
+    parser.add_argument("--write-batch", type=int, default=1000, help="users per bulk write")
+    parser.add_argument("--every", type=float, default=0, help="repeat every N seconds instead of running once")
+    args = parser.parse_args()
+
+    db = MongoClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+    while True:
+        run(db, args.window_days, args.candidates, args.chunk_size, args.read_batch, args.write_batch)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
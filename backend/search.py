@@ -0,0 +1,178 @@
+"""In-process inverted index for exercise and blog post search.
+
+Text is folded the Turkish way before tokenizing ("İ" -> "i", "I" -> "ı")
+and then stripped of diacritics, so "Göğüs", "GÖĞÜS" and "gogus" all
+produce the same token. The last query term also matches as a prefix,
+which keeps search-as-you-type working.
+"""
+import math
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+TURKISH_UPPER = str.maketrans({"İ": "i", "I": "ı"})
+ASCII_FOLD = str.maketrans({"ı": "i", "ğ": "g", "ş": "s", "ç": "c", "ö": "o", "ü": "u"})
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def fold(text: str) -> str:
+    text = text.translate(TURKISH_UPPER).lower().translate(ASCII_FOLD)
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def tokenize(text: str):
+    return TOKEN_RE.findall(fold(text))
+
+
+class SearchIndex:
+    """Immutable index; rebuild a new one and swap it in when content changes.
+
+    Postings are NumPy arrays and scoring works on dense per-document
+    vectors, so a query touching the whole catalogue stays in the low
+    milliseconds.
+    """
+
+    # kind -> [(field, weight)] used for scoring
+    FIELDS = {
+        "exercise": [("name", 3.0), ("muscle_group", 2.0), ("difficulty", 1.0), ("description", 1.0)],
+        "blog_post": [("title", 3.0), ("excerpt", 1.5), ("author", 1.0), ("content", 0.5)],
+    }
+    FACETS = ["type", "muscle_group", "difficulty"]
+
+    def __init__(self, documents):
+        # documents: iterable of (kind, doc) pairs
+        self.entries = []
+        postings = defaultdict(lambda: ([], []))
+        facet_codes = {name: [] for name in self.FACETS}
+        # name -> folded value -> code, and code -> display value
+        self._facet_lookup = {name: {} for name in self.FACETS}
+        self._facet_labels = {name: [] for name in self.FACETS}
+
+        for kind, doc in documents:
+            position = len(self.entries)
+            weights = Counter()
+            for field, weight in self.FIELDS[kind]:
+                for token in tokenize(doc.get(field) or ""):
+                    weights[token] += weight
+            for token, weight in weights.items():
+                positions, values = postings[token]
+                positions.append(position)
+                # Saturate repeated terms so long posts do not dominate
+                values.append(weight / (weight + 1.0))
+            entry = self._entry(kind, doc)
+            self.entries.append(entry)
+            for name in self.FACETS:
+                facet_codes[name].append(self._facet_code(name, entry[name]))
+
+        self.size = len(self.entries)
+        self.postings = {
+            token: (np.array(positions, dtype=np.int32), np.array(values, dtype=np.float32))
+            for token, (positions, values) in postings.items()
+        }
+        self.facet_codes = {name: np.array(codes, dtype=np.int32) for name, codes in facet_codes.items()}
+        self.vocabulary = sorted(self.postings)
+
+    def _facet_code(self, name: str, value) -> int:
+        if not value:
+            return -1
+        lookup = self._facet_lookup[name]
+        key = fold(value)
+        if key not in lookup:
+            lookup[key] = len(self._facet_labels[name])
+            self._facet_labels[name].append(value)
+        return lookup[key]
+
+    @staticmethod
+    def _entry(kind: str, doc: dict) -> dict:
+        if kind == "exercise":
+            return {
+                "type": kind,
+                "id": doc["id"],
+                "title": doc["name"],
+                "snippet": doc.get("description", ""),
+                "muscle_group": doc.get("muscle_group"),
+                "difficulty": doc.get("difficulty"),
+                "image": doc.get("thumbnail"),
+            }
+        return {
+            "type": kind,
+            "id": doc["id"],
+            "title": doc["title"],
+            "snippet": doc.get("excerpt", ""),
+            "muscle_group": None,
+            "difficulty": None,
+            "image": doc.get("image"),
+        }
+
+    def _expand(self, term: str):
+        start = bisect_left(self.vocabulary, term)
+        matches = []
+        for token in self.vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            matches.append(token)
+        return matches
+
+    def _term_scores(self, term: str, prefix: bool):
+        tokens = self._expand(term) if prefix else ([term] if term in self.postings else [])
+        scores = np.zeros(self.size, dtype=np.float32)
+        hits = np.zeros(self.size, dtype=bool)
+        for token in tokens:
+            positions, weights = self.postings[token]
+            idf = math.log(1 + self.size / len(positions))
+            # Exact matches outrank prefix completions
+            boost = 1.0 if token == term else 0.7
+            scores[positions] = np.maximum(scores[positions], weights * (idf * boost))
+            hits[positions] = True
+        return scores, hits
+
+    def search(self, query: str, filters: dict = None, limit: int = 20, offset: int = 0) -> dict:
+        terms = tokenize(query)
+        scores = np.zeros(self.size, dtype=np.float32)
+        mask = np.zeros(self.size, dtype=bool) if not terms else np.ones(self.size, dtype=bool)
+        for i, term in enumerate(terms):
+            term_scores, hits = self._term_scores(term, prefix=i == len(terms) - 1)
+            # Every term has to match
+            scores += term_scores
+            mask &= hits
+
+        for name, value in (filters or {}).items():
+            if value:
+                code = self._facet_lookup[name].get(fold(value), -2)
+                mask &= self.facet_codes[name] == code
+
+        positions = np.flatnonzero(mask)
+        facets = {}
+        for name in self.FACETS:
+            codes = self.facet_codes[name][positions]
+            counts = np.bincount(codes[codes >= 0], minlength=len(self._facet_labels[name]))
+            facets[name] = {
+                self._facet_labels[name][code]: int(counts[code])
+                for code in np.argsort(-counts, kind="stable") if counts[code]
+            }
+
+        # Only the requested window is fully sorted
+        matched = scores[positions]
+        window = offset + limit
+        if window < len(positions):
+            # Ties at the cut-off go to the lowest positions so pages never overlap
+            cutoff = np.partition(-matched, window - 1)[window - 1]
+            better = np.flatnonzero(-matched < cutoff)
+            tied = np.flatnonzero(-matched == cutoff)[:window - len(better)]
+            top = np.concatenate([better, tied])
+        else:
+            top = np.arange(len(positions))
+        order = top[np.lexsort((positions[top], -matched[top]))][offset:window]
+
+        return {
+            "total": int(len(positions)),
+            "results": [
+                {**self.entries[positions[i]], "score": round(float(matched[i]), 4)}
+                for i in order
+            ],
+            "facets": facets,
+        }
@@ -0,0 +1,105 @@
+"""Production entrypoint: several uvicorn workers with warm starts and graceful shutdown.
+
+Each worker is a separate spawned process that imports the app, so it gets
+its own Mongo client, and its lifespan pings Mongo, ensures indexes and warms
+the caches before the worker accepts connections. On SIGTERM a worker fails
+/readyz right away and keeps serving for --drain-delay seconds so load
+balancers stop routing to it. Then it stops accepting connections and waits
+up to --graceful-timeout for in-flight requests.
+
+    python serve.py --port 8001                 # one worker per core
+    WEB_CONCURRENCY=4 python serve.py --drain-delay 10
+
+gunicorn also works, because the Mongo client is recreated in each worker
+after fork. It does not get the drain delay:
+
+    gunicorn server:app -k uvicorn.workers.UvicornWorker -w 4 --preload
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+logger = logging.getLogger("serve")
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+
+class DrainingServer(uvicorn.Server):
+    """Delays uvicorn's shutdown after the first signal so readiness can fail first."""
+
+    def __init__(self, config: uvicorn.Config, drain_delay: float):
+        super().__init__(config)
+        self.drain_delay = drain_delay
+        self.draining = False
+
+    def stop(self, sig, frame):
+        if not self.should_exit:
+            super().handle_exit(sig, frame)
+
+    def handle_exit(self, sig, frame):
+        # A second signal skips the remaining delay
+        if self.draining or not self.drain_delay:
+            self.draining = True
+            super().handle_exit(sig, frame)
+            return
+        self.draining = True
+        # Imported here so the supervisor process never loads the app; in a worker it is already loaded
+        from server import begin_draining
+        begin_draining()
+        logger.info("Worker %d draining for %.0fs", os.getpid(), self.drain_delay)
+        asyncio.get_running_loop().call_later(self.drain_delay, self.stop, sig, frame)
+
+
+def worker_count(value: str) -> int:
+    if value == "auto":
+        return int(os.environ.get('WEB_CONCURRENCY', 0)) or os.cpu_count() or 1
+    return int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', 8001)))
+    parser.add_argument("--workers", type=worker_count, default="auto",
+                        help="worker processes; auto = WEB_CONCURRENCY or one per core")
+    parser.add_argument("--drain-delay", type=float, default=float(os.environ.get('DRAIN_DELAY_SECONDS', 0)),
+                        help="seconds a worker keeps serving with /readyz failing before it stops accepting")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.environ.get('GRACEFUL_TIMEOUT_SECONDS', 30)),
+                        help="seconds to wait for in-flight requests once accepting stops")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # Workers share the cores, so each one's bcrypt pool gets its share rather than all of them
+    os.environ.setdefault('PASSWORD_WORKERS', str(max(1, (os.cpu_count() or 1) // args.workers)))
+
+    config = uvicorn.Config(
+        "server:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        lifespan="on",
+        backlog=args.backlog,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+        proxy_headers=True,
+        server_header=False,
+    )
+    server = DrainingServer(config, args.drain_delay)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger.info("Starting %d workers on %s:%d", args.workers, args.host, args.port)
+    if args.workers > 1:
+        sock = config.bind_socket()
+        Multiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
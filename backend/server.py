@@ -1,30 +1,727 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from dotenv import load_dotenv
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
+import time
+import base64
+import hashlib
+import json
+import random
+import secrets
+import threading
+import zlib
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from bson import Timestamp, json_util
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, UpdateOne, monitoring
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError, field_validator
+from typing import Dict, List, Optional
 import uuid
-from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
+import brotli
+import httpx
+import jwt
+import orjson
+
+from media import MediaStorage, best_fitting, smallest_covering
+from metrics import Counter, Gauge, Registry
+from profiling import ProfiledRoute, ProfilerMiddleware, TraceBuffer, profile_span, record_span
+from search import SearchIndex
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics
+metrics_registry = Registry()
+http_requests = metrics_registry.counter("http_requests_total", "HTTP requests by method, route and status")
+http_latency = metrics_registry.histogram("http_request_duration_seconds", "HTTP request latency by method and route")
+http_in_flight = metrics_registry.gauge("http_requests_in_flight", "HTTP requests currently being served")
+mongo_latency = metrics_registry.histogram("mongo_command_duration_seconds", "MongoDB command latency by command and collection")
+mongo_errors = metrics_registry.counter("mongo_command_errors_total", "Failed MongoDB commands by command and collection")
+password_queue_wait = metrics_registry.histogram("password_queue_wait_seconds", "Time bcrypt jobs wait for a worker")
+password_work = metrics_registry.histogram("password_hash_duration_seconds", "Time spent in bcrypt by operation")
+
+class MetricsMiddleware:
+    """Records count, status and latency per route template, plus requests in flight."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            # The router stores the matched route in the scope; templates keep label cardinality bounded
+            route = scope.get("route")
+            labels = {"method": scope["method"], "route": route.path if route else "unmatched"}
+            http_requests.inc(status=str(status["code"]), **labels)
+            http_latency.observe(elapsed, **labels)
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command by command name and collection."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+
+    def _labels(self, event) -> dict:
+        return {"command": event.command_name, "collection": self._collections.pop(event.request_id, "")}
+
+    def succeeded(self, event):
+        labels = self._labels(event)
+        mongo_latency.observe(event.duration_micros / 1e6, **labels)
+        record_span("mongo", event.duration_micros / 1e6, f"{labels['command']} {labels['collection']}".strip())
+
+    def failed(self, event):
+        labels = self._labels(event)
+        mongo_latency.observe(event.duration_micros / 1e6, **labels)
+        mongo_errors.inc(**labels)
+        record_span("mongo", event.duration_micros / 1e6, f"{labels['command']} {labels['collection']} failed")
+
 # MongoDB connection
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Tracks checked-out connections and check-out wait time across all pools."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Check-outs start and finish on the same (executor) thread
+        self._local = threading.local()
+        self.open = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _waited(self) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def connection_check_out_failed(self, event):
+        self._waited()
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    # Pool lifecycle events are not needed for these metrics
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self) -> dict:
+        checkouts = self.checkouts or 1
+        return {
+            "max_pool_size": mongo_options["maxPoolSize"],
+            "min_pool_size": mongo_options["minPoolSize"],
+            "open_connections": self.open,
+            "checked_out": self.checked_out,
+            "checkouts": self.checkouts,
+            "checkout_failures": self.checkout_failures,
+            "wait_avg_ms": round(self.wait_total / checkouts * 1000, 3),
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+        }
+
+def mongo_write_concern() -> dict:
+    options = {}
+    w = os.environ.get('MONGO_WRITE_CONCERN')
+    if w:
+        options["w"] = int(w) if w.isdigit() else w
+    if os.environ.get('MONGO_WRITE_JOURNAL'):
+        options["journal"] = os.environ['MONGO_WRITE_JOURNAL'].lower() == 'true'
+    return options
+
+mongo_options = {
+    "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+    "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+    "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 0)) or None,
+    "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 0)) or None,
+    "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 30000)),
+    "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 20000)),
+    "socketTimeoutMS": int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 0)) or None,
+    **mongo_write_concern(),
+}
+pool_metrics = PoolMetrics()
+
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+
+def connect_mongo():
+    # MongoClient is not fork-safe, so a worker forked after import calls this again (see lifespan)
+    global client, db, catalog_db, client_pid
+    client = AsyncIOMotorClient(mongo_url, event_listeners=[pool_metrics, CommandMetrics()], **mongo_options)
+    db = client[os.environ['DB_NAME']]
+    # Uncached catalogue reads (NDJSON exports, recommendation joins) tolerate replication lag,
+    # so they may go to secondaries. Loaders that refill the response cache read the primary:
+    # right after an invalidation a lagging secondary would get its stale page cached for the TTL
+    catalog_db = client.get_database(
+        os.environ['DB_NAME'],
+        read_preference=make_read_preference(
+            read_pref_mode_from_name(os.environ.get('MONGO_CATALOG_READ_PREFERENCE', 'secondaryPreferred')),
+            None
+        )
+    )
+    client_pid = os.getpid()
+
+connect_mongo()
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+class PasswordPool:
+    """Runs bcrypt work on a bounded thread pool so it never blocks the event loop."""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        # bcrypt releases the GIL while hashing, so threads scale across cores
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password")
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    async def run(self, func, *args):
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please try again",
+                headers={"Retry-After": "1"}
+            )
+
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            result = func(*args)
+            return result, started - submitted, time.perf_counter() - started
+
+        self._pending += 1
+        try:
+            result, waited, took = await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self._pending -= 1
+
+        operation = getattr(func, "__name__", "bcrypt")
+        password_queue_wait.observe(waited, operation=operation)
+        password_work.observe(took, operation=operation)
+        record_span("bcrypt_queue", waited, operation)
+        record_span("bcrypt", took, operation)
+        self.completed += 1
+        self.queue_wait_total += waited
+        self.queue_wait_max = max(self.queue_wait_max, waited)
+        self.hash_time_total += took
+        self.hash_time_max = max(self.hash_time_max, took)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self.run(pwd_context.hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self.run(pwd_context.verify, password, password_hash)
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(self._pending, self.workers),
+            "queued": max(self._pending - self.workers, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": round(self.queue_wait_total / completed * 1000, 2),
+            "queue_wait_max_ms": round(self.queue_wait_max * 1000, 2),
+            "hash_time_avg_ms": round(self.hash_time_total / completed * 1000, 2),
+            "hash_time_max_ms": round(self.hash_time_max * 1000, 2),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_workers = int(os.environ.get('PASSWORD_WORKERS', os.cpu_count() or 2))
+password_pool = PasswordPool(
+    workers=password_workers,
+    max_queue=int(os.environ.get('PASSWORD_QUEUE_LIMIT', password_workers * 8))
+)
+
+# Rate limiting
+class MemoryRateLimitBackend:
+    """Per-process token buckets, bounded by dropping the least recently used keys."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at)
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, capacity: int, period: float) -> float:
+        now = time.monotonic()
+        rate = capacity / period
+        tokens, updated_at = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        allowed = tokens >= 1
+        self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return 0.0 if allowed else (1 - tokens) / rate
+
+class MongoRateLimitBackend:
+    """Buckets shared by all workers, refilled and taken in one atomic pipeline update."""
+
+    async def take(self, key: str, capacity: int, period: float) -> float:
+        now = datetime.now(timezone.utc)
+        rate = capacity / period
+        elapsed = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        refilled = {"$min": [capacity, {"$add": [{"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed, rate]}]}]}
+        bucket = await db.rate_limits.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": now}},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    # Full buckets carry no state, so let the TTL index drop them
+                    "expires_at": now + timedelta(seconds=period),
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return 0.0 if bucket["allowed"] else (1 - bucket["tokens"]) / rate
+
+class RateLimiter:
+    """Token buckets per scope, e.g. auth requests per IP and login attempts per email."""
+
+    def __init__(self, backend, limits: dict):
+        self.backend = backend
+        # scope -> (capacity, period in seconds)
+        self.limits = limits
+        self.allowed = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+    @staticmethod
+    def parse(spec: str):
+        capacity, period = spec.split("/")
+        return int(capacity), float(period)
+
+    async def check(self, scope: str, key: str):
+        capacity, period = self.limits[scope]
+        retry_after = await self.backend.take(f"{scope}:{key}", capacity, period)
+        if retry_after:
+            self.rejected[scope] += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many attempts, please try again later",
+                headers={"Retry-After": str(max(1, round(retry_after)))}
+            )
+        self.allowed[scope] += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "limits": {scope: {"capacity": c, "period_seconds": p} for scope, (c, p) in self.limits.items()},
+            "allowed": dict(self.allowed),
+            "rejected": dict(self.rejected),
+        }
+
+rate_limiter = RateLimiter(
+    backend=MongoRateLimitBackend() if os.environ.get('RATE_LIMIT_BACKEND') == 'mongo' else MemoryRateLimitBackend(),
+    limits={
+        # "<burst>/<seconds>": bursts up to <burst>, refilling fully over <seconds>
+        "auth_ip": RateLimiter.parse(os.environ.get('AUTH_RATE_LIMIT_IP', '20/60')),
+        "login_email": RateLimiter.parse(os.environ.get('AUTH_RATE_LIMIT_EMAIL', '5/300')),
+    }
+)
+
+async def limit_auth_by_ip(request: Request):
+    # Runs before the body is hashed or any user is looked up
+    await rate_limiter.check("auth_ip", request.client.host if request.client else "unknown")
+
+# Verified against for unknown emails so they cost the same as wrong passwords
+DUMMY_PASSWORD_HASH = pwd_context.hash(secrets.token_urlsafe(16))
+
+# Response cache for read-mostly catalogue endpoints
+class ResponseCache:
+    """Bounded LRU cache with a per-entry TTL, invalidated per collection."""
+
+    _MISSING = object()
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expires_at, collections, value), oldest first
+        self._entries = OrderedDict()
+        # Bumped on every write so loads that raced a write are not stored
+        self.versions = defaultdict(int)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return self._MISSING
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return self._MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def set(self, key, collections, value):
+        self._entries[key] = (time.monotonic() + self.ttl, frozenset(collections), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, key, collections, loader):
+        value = self.get(key)
+        if value is not self._MISSING:
+            return value
+        versions = [self.versions[c] for c in collections]
+        value = await loader()
+        if versions == [self.versions[c] for c in collections]:
+            self.set(key, collections, value)
+        return value
+
+    def invalidate(self, *collections):
+        for collection in collections:
+            self.versions[collection] += 1
+        stale = [key for key, (_, tags, _) in self._entries.items() if tags.intersection(collections)]
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+
+    def discard(self, key):
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('RESPONSE_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', 60))
+)
+
+# Conditional responses
+CONTENT_MAX_AGE = int(os.environ.get('CONTENT_MAX_AGE', 60))
+PLANS_MAX_AGE = int(os.environ.get('PLANS_MAX_AGE', 3600))
+
+# Mongo returns naive UTC datetimes; OPT_NAIVE_UTC keeps the "+00:00" offset clients parse
+JSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def dump_json(content) -> bytes:
+    # Plain dicts from Mongo go straight to orjson; models and other types fall back to FastAPI's encoder
+    with profile_span("json"):
+        return orjson.dumps(content, default=jsonable_encoder, option=JSON_OPTIONS)
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: orjson instead of the stdlib encoder."""
+
+    def render(self, content) -> bytes:
+        return dump_json(content)
+
+def render_json(content):
+    # Same encoding as the app's default response class, so cached bytes match uncached ones
+    body = dump_json(content)
+    return body, '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in [c[2:] if c.startswith("W/") else c for c in candidates]
+
+def conditional_response(request: Request, body: bytes, etag: str, max_age: int,
+                         headers: Optional[dict] = None, private: bool = False) -> Response:
+    # Responses that needed an Authorization header must never be stored by shared caches
+    headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Cache-Control": f"{'private' if private else 'public'}, max-age={max_age}",
+    }
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def cached_json(request: Request, key, collections, loader, max_age: int = CONTENT_MAX_AGE,
+                      private: bool = False):
+    # loader returns (content, extra_headers); content of None means not found
+    async def render():
+        content, headers = await loader()
+        if content is None:
+            return None
+        body, etag = render_json(content)
+        return body, etag, headers
+
+    rendered = await response_cache.get_or_load(key, collections, render)
+    if rendered is None:
+        return None
+    body, etag, headers = rendered
+    return conditional_response(request, body, etag, max_age, headers, private)
+
+# Response compression
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        # Sync-flush every chunk so streamed lines reach the client without waiting for the end
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        body = self._compressor.process(data)
+        return body + (self._compressor.finish() if final else self._compressor.flush())
+
+class CompressionMiddleware:
+    """Compresses JSON and text responses with brotli or gzip, whichever the client accepts first in our order."""
+
+    def __init__(self, app, minimum_size: int = 1024, encodings=("br", "gzip"),
+                 gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders = {
+            "br": lambda: BrotliEncoder(brotli_quality),
+            "gzip": lambda: GzipEncoder(gzip_level),
+        }
+        self.encodings = [e for e in encodings if e in self.encoders]
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        accepted = {}
+        for part in accept_encoding.split(","):
+            name, _, params = part.partition(";")
+            q = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    q = float(params.strip()[2:])
+                except ValueError:
+                    q = 0.0
+            accepted[name.strip().lower()] = q
+        for encoding in self.encodings:
+            if accepted.get(encoding, accepted.get("*", 0)) > 0:
+                return encoding
+        return None
+
+    def eligible(self, start: dict, body: bytes, more_body: bool) -> bool:
+        headers = Headers(raw=start["headers"])
+        return (
+            200 <= start["status"] < 300 and start["status"] != 204
+            and "content-encoding" not in headers
+            and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            # Streams are compressed whatever their size; small bodies are not worth the CPU
+            and (more_body or len(body) >= self.minimum_size)
+        )
+
+    async def __call__(self, scope, receive, send):
+        encoding = self.negotiate(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether compression applies
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                if not self.eligible(start, body, more_body):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = self.encoders[encoding]()
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                # The compressed bytes differ from the identity body the ETag was computed over
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+                del headers["content-length"]
+                with profile_span("compress", encoding):
+                    body = encoder.compress(body, not more_body)
+                if not more_body:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+            else:
+                with profile_span("compress", encoding):
+                    body = encoder.compress(body, not more_body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+# Application lifecycle
+MONGO_STARTUP_TIMEOUT = float(os.environ.get('MONGO_STARTUP_TIMEOUT_SECONDS', 60))
+READINESS_TIMEOUT = float(os.environ.get('READINESS_TIMEOUT_SECONDS', 2))
+WARMUP_PATHS = [p.strip() for p in os.environ.get(
+    'WARMUP_PATHS', '/api/subscriptions/plans,/api/blog/posts'
+).split(',') if p.strip()]
+
+async def wait_for_mongo(timeout: float = MONGO_STARTUP_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.admin.command("ping")
+            return
+        except PyMongoError as e:
+            if time.monotonic() >= deadline:
+                raise
+            logger.warning("MongoDB not reachable yet, retrying: %s", e)
+            await asyncio.sleep(1)
+
+async def warm_up(app: FastAPI):
+    # Hot endpoints run once through the full stack: fills the response cache and opens pool connections
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as http:
+        for path in WARMUP_PATHS:
+            response = await http.get(path)
+            if response.status_code >= 400:
+                logger.warning("Warm-up request %s returned %d", path, response.status_code)
+
+def begin_draining():
+    # Called on the first shutdown signal so /readyz fails while in-flight requests finish
+    app.state.ready = False
+    app.state.draining = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.draining = False
+    if client_pid != os.getpid():
+        connect_mongo()
+    await wait_for_mongo()
+    app.state.index_report = await ensure_indexes()
+    await migrate_published_at()
+    # Opened before the caches are built, so no write can fall between building and following
+    await change_feed.start()
+    await plan_catalog.reload()
+    await search_service.rebuild()
+    payment_processor.start()
+    rollup_repair.start()
+    await warm_up(app)
+    app.state.ready = True
+    logger.info("Worker %d ready", os.getpid())
+    try:
+        yield
+    finally:
+        begin_draining()
+        await change_feed.stop()
+        await payment_processor.stop()
+        await rollup_repair.stop()
+        client.close()
+        password_pool.shutdown()
+
+# Request profiling
+# Opt-in: with PROFILING unset no trace is ever bound and the hooks cost a context variable lookup
+PROFILING = os.environ.get('PROFILING', 'false').lower() == 'true'
+profile_buffer = TraceBuffer(int(os.environ.get('PROFILE_BUFFER_SIZE', 200)))
+
 # Create the main app
-app = FastAPI()
-api_router = APIRouter(prefix="/api")
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+api_router = APIRouter(prefix="/api", route_class=ProfiledRoute)
 
 # Models
 class User(BaseModel):
@@ -44,6 +741,25 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+class AuthSession(User):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class TokenClaims(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    sub: str
+    email: str
+    subscription_plan: str
+    has_anatomy: bool
+    has_video_swipe: bool
+    # Absent from tokens issued before the flag existed
+    has_recommendations: bool = False
+
 class SubscriptionPlan(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str
@@ -52,6 +768,7 @@ class SubscriptionPlan(BaseModel):
     features: List[str]
     has_anatomy: bool
     has_video_swipe: bool
+    has_recommendations: bool = False
 
 class Exercise(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -63,6 +780,29 @@ class Exercise(BaseModel):
     description: str
     video_url: str
     thumbnail: str
+    # Media asset ids, derived from the URLs on import (see media_asset_id)
+    video_asset_id: Optional[str] = None
+    thumbnail_asset_id: Optional[str] = None
+
+class Rendition(BaseModel):
+    label: str
+    content_type: str
+    width: int
+    height: int
+    bytes: int = 0
+    bitrate_kbps: Optional[int] = None
+    # An object key in the media bucket or, for media hosted elsewhere, a direct URL
+    key: Optional[str] = None
+    url: Optional[str] = None
+
+class MediaAsset(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    kind: str = Field(pattern="^(video|image)$")
+    source_url: Optional[str] = None
+    duration_seconds: Optional[float] = None
+    renditions: List[Rendition] = []
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class BlogPost(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -81,6 +821,30 @@ class DashboardStats(BaseModel):
     calories_burned: int
     muscle_balance: int
     weekly_progress: List[dict]
+    weekly_trend: List[dict] = []
+
+class WorkoutCreate(BaseModel):
+    exercise_id: Optional[str] = None
+    muscle_group: str
+    duration_minutes: int = Field(gt=0, le=600)
+    calories: int = Field(ge=0, le=10000)
+    performed_at: Optional[datetime] = None
+
+class Workout(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    exercise_id: Optional[str] = None
+    muscle_group: str
+    duration_minutes: int
+    calories: int
+    performed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    @field_validator("performed_at")
+    @classmethod
+    def assume_utc(cls, value: datetime) -> datetime:
+        # Clients may omit the offset and Mongo returns naive UTC; local time would shift the rollup day
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
 
 class PaymentRequest(BaseModel):
     plan_name: str
@@ -89,14 +853,1233 @@ class PaymentRequest(BaseModel):
     expiry: str
     cvv: str
 
+class Payment(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    idempotency_key: str
+    plan_name: str
+    amount: int
+    card_last4: str
+    status: str = "pending"
+    attempts: int = 0
+    transaction_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+# Subscription plan catalogue
+DEFAULT_SUBSCRIPTION_PLANS = [
+    SubscriptionPlan(
+        id="free",
+        name="Ücretsiz",
+        price=0,
+        features=["Blog erişimi", "Hakkımızda erişimi"],
+        has_anatomy=False,
+        has_video_swipe=False
+    ),
+    SubscriptionPlan(
+        id="basic",
+        name="Temel",
+        price=100,
+        features=["Egzersiz modülü", "Kas seçim sistemi", "Temel analizler"],
+        has_anatomy=True,
+        has_video_swipe=False
+    ),
+    SubscriptionPlan(
+        id="advanced",
+        name="Gelişmiş",
+        price=300,
+        features=["Video swipe modülü", "Detaylı analizler", "Dashboard erişimi", "Diyet planları"],
+        has_anatomy=True,
+        has_video_swipe=True
+    ),
+    SubscriptionPlan(
+        id="comprehensive",
+        name="Kapsamlı",
+        price=500,
+        features=["Tüm özellikler", "Kişisel antrenör desteği", "AI öneriler", "Öncelikli destek", "3D kas animasyonları"],
+        has_anatomy=True,
+        has_video_swipe=True,
+        has_recommendations=True
+    )
+]
+
+class PlanCatalog:
+    """Plan definitions validated and serialized once, served as raw bytes."""
+
+    def __init__(self, plans: List[SubscriptionPlan]):
+        self._apply(plans, "default")
+
+    def _apply(self, plans: List[SubscriptionPlan], source: str):
+        self.plans = plans
+        self.by_name = {plan.name: plan for plan in plans}
+        self.body, self.etag = render_json(plans)
+        self.source = source
+
+    async def reload(self):
+        # Precedence: PLANS_FILE, then the subscription_plans collection, then defaults
+        plans_file = os.environ.get('PLANS_FILE')
+        if plans_file:
+            with open(plans_file, encoding="utf-8") as f:
+                docs = json.load(f)
+            source = plans_file
+        else:
+            docs = await db.subscription_plans.find({}, {"_id": 0}).sort("price", 1).to_list(100)
+            source = "subscription_plans"
+        if docs:
+            self._apply([SubscriptionPlan(**doc) for doc in docs], source)
+        else:
+            self._apply(DEFAULT_SUBSCRIPTION_PLANS, "default")
+        logger.info("Loaded %d subscription plans from %s", len(self.plans), self.source)
+
+plan_catalog = PlanCatalog(DEFAULT_SUBSCRIPTION_PLANS)
+
+# Access tokens
+JWT_ALGORITHM = "HS256"
+JWT_SECRET = os.environ.get('JWT_SECRET')
+if not JWT_SECRET:
+    JWT_SECRET = secrets.token_urlsafe(32)
+    logging.getLogger(__name__).warning(
+        "JWT_SECRET is not set; tokens will not survive restarts or work across workers"
+    )
+ACCESS_TOKEN_TTL = int(os.environ.get('ACCESS_TOKEN_TTL_SECONDS', 900))
+REFRESH_TOKEN_TTL = int(os.environ.get('REFRESH_TOKEN_TTL_SECONDS', 86400))
+
+def issue_session(user: User) -> AuthSession:
+    # Entitlements are resolved once here from the in-memory plan catalogue and
+    # carried in the token, so gated endpoints never look the user up
+    plan = plan_catalog.by_name.get(user.subscription_plan)
+    now = int(time.time())
+    access_token = jwt.encode({
+        "type": "access",
+        "sub": user.id,
+        "email": user.email,
+        "subscription_plan": user.subscription_plan,
+        "has_anatomy": bool(plan and plan.has_anatomy),
+        "has_video_swipe": bool(plan and plan.has_video_swipe),
+        "has_recommendations": bool(plan and plan.has_recommendations),
+        "iat": now,
+        "exp": now + ACCESS_TOKEN_TTL,
+    }, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    refresh_token = jwt.encode({
+        "type": "refresh",
+        "sub": user.id,
+        "iat": now,
+        "exp": now + REFRESH_TOKEN_TTL,
+    }, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return AuthSession(
+        **user.model_dump(),
+        access_token=access_token,
+        refresh_token=refresh_token,
+        expires_in=ACCESS_TOKEN_TTL
+    )
+
+def decode_token(token: str, token_type: str) -> dict:
+    try:
+        claims = jwt.decode(
+            token, JWT_SECRET, algorithms=[JWT_ALGORITHM],
+            options={"require": ["exp", "sub", "type"]}
+        )
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired", headers={"WWW-Authenticate": "Bearer"})
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+    if claims["type"] != token_type:
+        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+    return claims
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+async def current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> TokenClaims:
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return TokenClaims(**decode_token(credentials.credentials, "access"))
+
+def require_feature(flag: str):
+    async def check_feature(user: TokenClaims = Depends(current_user)) -> TokenClaims:
+        if not getattr(user, flag):
+            raise HTTPException(status_code=403, detail="Your subscription plan does not include this feature")
+        return user
+    return check_feature
+
+async def optional_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> Optional[TokenClaims]:
+    # For endpoints that serve everyone but show entitled users more
+    if credentials is None:
+        return None
+    return TokenClaims(**decode_token(credentials.credentials, "access"))
+
+# Operator credential for imports and other maintenance endpoints; they are disabled while it is unset
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+def is_admin_token(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN and token and secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()))
+
+async def require_admin(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)):
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    if not is_admin_token(credentials.credentials):
+        raise HTTPException(status_code=403, detail="Admin credentials required")
+
+# Payment processing
+class PaymentDeclined(Exception):
+    pass
+
+class MockPaymentProvider:
+    """Demo provider: always approves, optionally failing transiently to exercise retries."""
+
+    def __init__(self, failure_rate: float = 0.0):
+        self.failure_rate = failure_rate
+        # provider idempotency key -> transaction id, like a real gateway
+        self._charges = {}
+
+    async def charge(self, idempotency_key: str, amount: int, card_last4: str) -> str:
+        await asyncio.sleep(0.05)
+        if idempotency_key in self._charges:
+            return self._charges[idempotency_key]
+        if random.random() < self.failure_rate:
+            raise ConnectionError("Payment provider unavailable")
+        self._charges[idempotency_key] = f"mock_{uuid.uuid4().hex[:12]}"
+        return self._charges[idempotency_key]
+
+class PaymentProcessor:
+    """Background workers that charge pending payments and activate the plan."""
+
+    def __init__(self, provider, workers: int, max_attempts: int, lease_seconds: int):
+        self.provider = provider
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.queue = asyncio.Queue(maxsize=1000)
+        self._tasks = []
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._sweep()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, payment_id: str):
+        try:
+            self.queue.put_nowait(payment_id)
+        except asyncio.QueueFull:
+            # Still persisted as pending; the sweep picks it up
+            logger.warning("Payment queue full, deferring %s to sweep", payment_id)
+
+    async def _claim(self, query: dict):
+        # The lease makes a payment owned by one worker (in any process) at a time
+        now = datetime.now(timezone.utc)
+        return await db.payments.find_one_and_update(
+            {**query, "$or": [
+                {"status": "pending"},
+                {"status": "processing", "locked_until": {"$lt": now}},
+            ]},
+            {"$set": {
+                "status": "processing",
+                "locked_until": now + timedelta(seconds=self.lease_seconds),
+                "updated_at": now,
+            }},
+            projection={"_id": 0},
+            # Only fields the claim does not touch are used afterwards
+            return_document=ReturnDocument.BEFORE
+        )
+
+    async def _sweep(self):
+        # Recovers payments left behind by a full queue, a crash or another worker
+        while True:
+            try:
+                cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.lease_seconds)
+                async for doc in db.payments.find(
+                    {"status": {"$in": ["pending", "processing"]}, "updated_at": {"$lt": cutoff}},
+                    {"_id": 0, "id": 1}
+                ):
+                    self.submit(doc["id"])
+            except Exception:
+                logger.exception("Payment sweep failed")
+            await asyncio.sleep(self.lease_seconds)
+
+    async def _work(self):
+        while True:
+            payment_id = await self.queue.get()
+            try:
+                await self.process(payment_id)
+            except Exception:
+                logger.exception("Processing payment %s failed", payment_id)
+            finally:
+                self.queue.task_done()
+
+    async def process(self, payment_id: str):
+        payment = await self._claim({"id": payment_id})
+        if not payment:
+            return
+
+        error = None
+        for attempt in range(payment["attempts"] + 1, self.max_attempts + 1):
+            await db.payments.update_one({"id": payment_id}, {"$set": {"attempts": attempt}})
+            try:
+                # The payment id doubles as the provider's idempotency key, so a
+                # retry after a lost response never charges twice
+                transaction_id = await self.provider.charge(payment_id, payment["amount"], payment["card_last4"])
+            except PaymentDeclined as e:
+                error = str(e)
+                break
+            except Exception as e:
+                error = str(e)
+                if attempt < self.max_attempts:
+                    await asyncio.sleep(min(2 ** attempt * 0.25, 10))
+                continue
+
+            await db.users.update_one(
+                {"id": payment["user_id"]},
+                {"$set": {"subscription_plan": payment["plan_name"]}}
+            )
+            await db.payments.update_one(
+                {"id": payment_id},
+                {"$set": {"status": "succeeded", "transaction_id": transaction_id, "error": None,
+                          "updated_at": datetime.now(timezone.utc)}, "$unset": {"locked_until": ""}}
+            )
+            return
+
+        await db.payments.update_one(
+            {"id": payment_id},
+            {"$set": {"status": "failed", "error": error, "updated_at": datetime.now(timezone.utc)},
+             "$unset": {"locked_until": ""}}
+        )
+
+payment_processor = PaymentProcessor(
+    provider=MockPaymentProvider(failure_rate=float(os.environ.get('PAYMENT_MOCK_FAILURE_RATE', 0))),
+    workers=int(os.environ.get('PAYMENT_WORKERS', 4)),
+    max_attempts=int(os.environ.get('PAYMENT_MAX_ATTEMPTS', 5)),
+    lease_seconds=int(os.environ.get('PAYMENT_LEASE_SECONDS', 60))
+)
+
+# Workout rollups
+MUSCLE_GROUPS = ["Göğüs", "Sırt", "Bacak", "Omuz", "Kol", "Karın"]
+MAX_BATCH_GROUPS = 20
+WEEKDAY_LABELS = ["Pzt", "Sal", "Çar", "Per", "Cum", "Cmt", "Paz"]
+
+# Rollup documents live in workout_rollups with _id "<user_id>:total" for
+# lifetime totals and "<user_id>:<YYYY-MM-DD>" for each UTC day.
+# A workout is stored with rollup_pending set and the flag is cleared once its
+# rollups are written, so a request that dies in between leaves a marker the
+# repair sweep finds. Each rollup keeps the ids of the workouts it last counted,
+# which makes applying a workout again a no-op.
+ROLLUP_APPLIED_WINDOW = 100
+ROLLUP_REPAIR_SECONDS = int(os.environ.get('ROLLUP_REPAIR_SECONDS', 60))
+
+def rollup_id(user_id: str, day: str) -> str:
+    return f"{user_id}:{day}"
+
+def rollup_updates(workout: Workout) -> List[UpdateOne]:
+    day = workout.performed_at.astimezone(timezone.utc).date().isoformat()
+    increments = {
+        "workouts": 1,
+        "duration_minutes": workout.duration_minutes,
+        "calories": workout.calories,
+        f"muscles.{workout.muscle_group}": workout.duration_minutes,
+    }
+    return [
+        UpdateOne(
+            {"_id": rollup_id(workout.user_id, key), "applied": {"$ne": workout.id}},
+            {
+                "$inc": increments,
+                "$setOnInsert": {"user_id": workout.user_id, "day": key},
+                "$push": {"applied": {"$each": [workout.id], "$slice": -ROLLUP_APPLIED_WINDOW}},
+            },
+            upsert=True
+        )
+        for key in ("total", day)
+    ]
+
+async def apply_rollups(workout: Workout):
+    try:
+        # Each $inc is atomic, so concurrent workouts never lose an update
+        await db.workout_rollups.bulk_write(rollup_updates(workout), ordered=False)
+    except BulkWriteError as e:
+        # A rollup that already counted the workout fails the filter, and its upsert collides on _id
+        if e.details.get("writeConcernErrors") or any(err["code"] != 11000 for err in e.details["writeErrors"]):
+            raise
+    await db.workouts.update_one({"id": workout.id}, {"$unset": {"rollup_pending": ""}})
+
+class RollupRepair:
+    """Applies the rollups of workouts whose request failed after storing them."""
+
+    def __init__(self, lease_seconds: int):
+        self.lease_seconds = lease_seconds
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._sweep())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def repair(self) -> int:
+        repaired = 0
+        while True:
+            now = datetime.now(timezone.utc)
+            # In-flight requests clear their own flag; the lease keeps workers from repeating each other
+            doc = await db.workouts.find_one_and_update(
+                {"rollup_pending": {"$lt": now - timedelta(seconds=self.lease_seconds)}},
+                {"$set": {"rollup_pending": now}},
+                projection={"_id": 0}
+            )
+            if doc is None:
+                break
+            await apply_rollups(Workout(**doc))
+            repaired += 1
+        if repaired:
+            logger.info("Repaired the rollups of %d workouts", repaired)
+        return repaired
+
+    async def _sweep(self):
+        while True:
+            try:
+                await self.repair()
+            except Exception:
+                logger.exception("Rollup repair failed")
+            await asyncio.sleep(self.lease_seconds)
+
+rollup_repair = RollupRepair(ROLLUP_REPAIR_SECONDS)
+
+def muscle_balance_score(muscles: dict) -> int:
+    # 100 when training time is spread evenly over all groups, 0 when it all
+    # goes to one group (scaled total variation distance from uniform)
+    minutes = [muscles.get(group, 0) for group in MUSCLE_GROUPS]
+    total = sum(minutes)
+    if not total:
+        return 0
+    uniform = 1 / len(MUSCLE_GROUPS)
+    distance = sum(abs(m / total - uniform) for m in minutes) / 2
+    return round(100 * (1 - distance / (1 - uniform)))
+
+# Recommendations
+# recommendations.py precomputes ranked candidates per user into recommendations
+# (_id = user_id, or "_default" for users without history); serving is a cached
+# lookup plus a re-rank against workouts logged since that run
+DIFFICULTY_LEVELS = {"Başlangıç": 0.0, "Orta": 0.5, "İleri": 1.0}
+DEFAULT_RECOMMENDATIONS_ID = "_default"
+
+recommendation_cache = ResponseCache(
+    max_entries=int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('RECOMMENDATION_CACHE_TTL', 300))
+)
+
+def rerank(candidates: List[dict], recent: List[dict], limit: int) -> List[dict]:
+    # Exercises done since the last run sink, groups trained since sink a little
+    done = {w.get("exercise_id") for w in recent}
+    trained = {w["muscle_group"] for w in recent}
+    rescored = sorted(
+        ({**c, "score": c["score"]
+          * (0.5 if c["exercise_id"] in done else 1.0)
+          * (0.8 if c["muscle_group"] in trained else 1.0)} for c in candidates),
+        key=lambda c: -c["score"]
+    )
+    # At most a third of the list per muscle group, so one large gap does not crowd out the rest
+    per_group = max(1, -(-limit // 3))
+    counts = defaultdict(int)
+    picked, overflow = [], []
+    for candidate in rescored:
+        if len(picked) == limit:
+            break
+        if counts[candidate["muscle_group"]] < per_group:
+            counts[candidate["muscle_group"]] += 1
+            picked.append(candidate)
+        else:
+            overflow.append(candidate)
+    return (picked + overflow)[:limit]
+
+async def recommend(user_id: str, limit: int) -> List[dict]:
+    async def load():
+        return (await db.recommendations.find_one({"_id": user_id})
+                or await db.recommendations.find_one({"_id": DEFAULT_RECOMMENDATIONS_ID}))
+
+    doc = await recommendation_cache.get_or_load(user_id, ["recommendations"], load)
+    if not doc:
+        return []
+    recent = await db.workouts.find(
+        {"user_id": user_id, "performed_at": {"$gte": doc["computed_at"]}},
+        {"_id": 0, "exercise_id": 1, "muscle_group": 1}
+    ).to_list(200)
+    ranked = rerank(doc["candidates"], recent, limit)
+    exercises = await catalog_db.exercises.find(
+        {"id": {"$in": [c["exercise_id"] for c in ranked]}}, EXERCISE_PROJECTION
+    ).to_list(limit)
+    by_id = {e["id"]: e for e in exercises}
+    # Exercises removed since the last run are skipped
+    return [
+        {"exercise": by_id[c["exercise_id"]], "score": round(c["score"], 4), "reasons": c["reasons"]}
+        for c in ranked if c["exercise_id"] in by_id
+    ]
+
+# Search index over exercises and blog posts
+class SearchService:
+    """Holds the current SearchIndex and rebuilds it in the background when content changes."""
+
+    def __init__(self):
+        self.index = None
+        self.rebuilds = 0
+        self.last_build_ms = 0.0
+        self._dirty = True
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    async def rebuild(self):
+        async with self._lock:
+            # Loop so changes that land mid-build are picked up by one more pass
+            while self._dirty:
+                self._dirty = False
+                started = time.perf_counter()
+                # Read from the primary so a rebuild right after an import sees it
+                exercises = await db.exercises.find({}, {"_id": 0}).to_list(None)
+                posts = await db.blog_posts.find({}, {"_id": 0}).to_list(None)
+                documents = [("exercise", e) for e in exercises] + [("blog_post", p) for p in posts]
+                # Tokenizing a large catalogue would otherwise stall the event loop
+                self.index = await asyncio.to_thread(SearchIndex, documents)
+                self.rebuilds += 1
+                self.last_build_ms = round((time.perf_counter() - started) * 1000, 2)
+                logger.info("Search index rebuilt with %d documents in %sms",
+                            self.index.size, self.last_build_ms)
+
+    def mark_stale(self):
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.rebuild())
+
+    async def get(self) -> SearchIndex:
+        if self.index is None:
+            await self.rebuild()
+        return self.index
+
+search_service = SearchService()
+
+def invalidate_caches(collection: str):
+    # This worker's caches built over a collection
+    response_cache.invalidate(collection)
+    if collection in ("exercises", "blog_posts"):
+        search_service.mark_stale()
+    elif collection == "recommendations":
+        recommendation_cache.invalidate(collection)
+
+async def content_changed(collection: str, local: bool = True):
+    # Single hook for every write to catalogue content; other workers hear of it through the change feed.
+    # Offline tools pass local=False: they hold no caches, and a search rebuild would die with the process
+    # Published first, so the local drop also covers every write the feed orders before the bump
+    await change_feed.publish(collection)
+    if local:
+        invalidate_caches(collection)
+
+# Change feed
+# Each worker keeps its own caches, so writes made by another worker, a batch
+# job or a mongo shell reach them through a change stream over the database.
+# Standalone servers have no change streams; there workers poll the version
+# counters in cache_versions instead, which content_changed and the batch jobs
+# bump, so only writes made through this code base are seen.
+CACHED_COLLECTIONS = ["exercises", "blog_posts", "media_assets", "subscription_plans", "recommendations"]
+# Per-user documents derived from workouts, dropped once their user is deleted
+USER_DERIVED_COLLECTIONS = ["workout_rollups", "recommendations"]
+CHANGE_FEED_MODE = os.environ.get('CHANGE_FEED_MODE', 'auto')  # auto, stream, poll or off
+CHANGE_FEED_POLL_INTERVAL = float(os.environ.get('CHANGE_FEED_POLL_SECONDS', 5))
+CHANGE_FEED_CHECKPOINT_INTERVAL = float(os.environ.get('CHANGE_FEED_CHECKPOINT_SECONDS', 30))
+CHANGE_FEED_MAX_BATCH = 1000
+# "The $changeStream stage is only supported on replica sets"
+NO_CHANGE_STREAMS = 40573
+# ChangeStreamFatalError, ChangeStreamHistoryLost: the resume token fell off the oplog
+RESUME_TOKEN_LOST = (280, 286)
+
+async def purge_orphans() -> int:
+    # Derived documents whose user no longer exists; a scan, but users are rarely deleted
+    removed, users = 0, set()
+    for name in USER_DERIVED_COLLECTIONS:
+        orphans = [doc["_id"] async for doc in db[name].aggregate([
+            {"$match": {"user_id": {"$nin": [None, DEFAULT_RECOMMENDATIONS_ID]}}},
+            {"$group": {"_id": "$user_id"}},
+            {"$lookup": {"from": "users", "localField": "_id", "foreignField": "id", "as": "user"}},
+            {"$match": {"user": {"$size": 0}}},
+        ])]
+        if orphans:
+            result = await db[name].delete_many({"user_id": {"$in": orphans}})
+            removed += result.deleted_count
+            users.update(orphans)
+    for user_id in users:
+        recommendation_cache.discard(user_id)
+    if removed:
+        logger.info("Removed %d rollup and recommendation documents of deleted users", removed)
+    return removed
+
+class ChangeBatch:
+    """The effects of a run of change events, applied together."""
+
+    def __init__(self, own: dict = None):
+        self.size = 0
+        # Versions this worker bumped itself, per collection
+        self.own = own or {}
+        self.collections = set()
+        self.recommendations = set()
+        self.users_deleted = None
+        self.everything = False
+
+    def add(self, change: dict):
+        self.size += 1
+        if change["operationType"] in ("invalidate", "dropDatabase"):
+            self.everything = True
+            return
+        collection = change["ns"]["coll"]
+        key = change.get("documentKey", {}).get("_id")
+        if collection == "cache_versions":
+            # A version bump stands for a write to the collection it is named after
+            collection, key = key, None
+            version = (change.get("updateDescription", {}).get("updatedFields", {}).get("version")
+                       or change.get("fullDocument", {}).get("version"))
+            if version in self.own.get(collection, ()):
+                # Our own bump: the caches were dropped after it, so they already
+                # reflect it and every write to the collection that came before it
+                self.own[collection].discard(version)
+                self.collections.discard(collection)
+                return
+        if collection == "users":
+            # Only deletes pass the stream filter; the cluster time orders them across workers
+            self.users_deleted = max(self.users_deleted or change["clusterTime"], change["clusterTime"])
+        elif collection == "recommendations" and key not in (None, DEFAULT_RECOMMENDATIONS_ID):
+            self.recommendations.add(key)
+        else:
+            self.collections.add(collection)
+
+class ChangeFeed:
+    """Follows writes to cached collections and applies them to this worker's caches.
+
+    The stream's resume token is persisted in change_feed, so after a restart
+    the feed replays what happened while no worker was following: caches are
+    built fresh at startup, but user deletions missed in the meantime are
+    still applied without a full reconciliation.
+    """
+
+    def __init__(self, mode: str):
+        self.requested_mode = mode
+        self.mode = "off"
+        self.versions = {}
+        self.published = {}
+        self.resume_token = None
+        self.events = 0
+        self.batches = 0
+        self.last_event_at = None
+        self._stream = None
+        self._task = None
+        self._checkpointed = 0.0
+
+    async def start(self):
+        if self.requested_mode == "off":
+            return
+        self.versions = {doc["_id"]: doc["version"] for doc in await db.cache_versions.find({}).to_list(None)}
+        mode = self.requested_mode
+        if mode == "auto" and not await self._has_change_streams():
+            logger.info("MongoDB has no change streams (standalone server), polling every %ss",
+                        CHANGE_FEED_POLL_INTERVAL)
+            mode = "poll"
+        if mode in ("auto", "stream"):
+            try:
+                await self._replay()
+                self.mode = "stream"
+            except OperationFailure as e:
+                # Reported by the server itself should the topology check above not tell
+                if e.code != NO_CHANGE_STREAMS or mode == "stream":
+                    raise
+                await self._stream.close()
+                self._stream = None
+                logger.info("MongoDB has no change streams (standalone server), polling every %ss",
+                            CHANGE_FEED_POLL_INTERVAL)
+                self.mode = "poll"
+        else:
+            self.mode = "poll"
+        self._task = asyncio.get_running_loop().create_task(self._follow() if self.mode == "stream" else self._poll())
+
+    @staticmethod
+    async def _has_change_streams() -> bool:
+        # Replica set members report their set name; mongos reports "isdbgrid"
+        hello = await client.admin.command("hello")
+        return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._stream:
+            await self._stream.close()
+            self._stream = None
+        if self.mode == "stream":
+            await self._checkpoint(force=True)
+
+    async def publish(self, collection: str):
+        doc = await db.cache_versions.find_one_and_update(
+            {"_id": collection}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        # Skip our own bump when polling, unless another worker's landed in between
+        if self.versions.get(collection, 0) == doc["version"] - 1:
+            self.versions[collection] = doc["version"]
+        if self.mode == "stream":
+            self.published.setdefault(collection, set()).add(doc["version"])
+
+    def _open(self, resume_token):
+        pipeline = [
+            {"$match": {"$or": [
+                {"ns.coll": {"$in": CACHED_COLLECTIONS + ["cache_versions"]}},
+                {"ns.coll": "users", "operationType": "delete"},
+                {"operationType": {"$in": ["invalidate", "dropDatabase"]}},
+            ]}},
+            # Only what ChangeBatch reads, so bulk imports don't ship whole documents;
+            # the version fields tell our own cache_versions bumps from other workers'
+            {"$project": {"operationType": 1, "ns": 1, "documentKey": 1, "clusterTime": 1,
+                          "fullDocument.version": 1, "updateDescription.updatedFields.version": 1}},
+        ]
+        return db.watch(pipeline, resume_after=resume_token, max_await_time_ms=1000)
+
+    async def _read(self, stream):
+        batch = ChangeBatch(self.published)
+        while batch.size < CHANGE_FEED_MAX_BATCH:
+            change = await stream.try_next()
+            if change is None:
+                break
+            batch.add(change)
+        return batch, stream.resume_token
+
+    async def _replay(self):
+        state = await db.change_feed.find_one({"_id": "stream"})
+        self._stream = self._open(state["resume_token"] if state else None)
+        try:
+            while True:
+                batch, token = await self._read(self._stream)
+                # Caches are built after this, so only the persisted views need the backlog
+                await self.apply(batch, caches=False)
+                self.resume_token = token
+                if batch.size < CHANGE_FEED_MAX_BATCH:
+                    break
+        except OperationFailure as e:
+            if e.code not in RESUME_TOKEN_LOST:
+                raise
+            logger.warning("Change feed resume token expired, reconciling: %s", e)
+            await self._stream.close()
+            await purge_orphans()
+            self._stream = self._open(None)
+            self.resume_token = None
+            await self._stream.try_next()
+            self.resume_token = self._stream.resume_token
+        await self._checkpoint(force=True)
+
+    async def _follow(self):
+        reconcile = False
+        while True:
+            try:
+                if reconcile:
+                    await self.reconcile()
+                    reconcile = False
+                if self._stream is None:
+                    self._stream = self._open(self.resume_token)
+                batch, token = await self._read(self._stream)
+                await self.apply(batch)
+                self.resume_token = token
+                if batch.everything:
+                    # The stream closes after an invalidate event; start over from now
+                    await self._stream.close()
+                    self._stream = None
+                    self.resume_token = None
+                await self._checkpoint()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Reopened from the last applied position, so a failed batch is read again
+                if self._stream:
+                    await self._stream.close()
+                    self._stream = None
+                if isinstance(e, OperationFailure) and e.code in RESUME_TOKEN_LOST:
+                    logger.warning("Change feed resume token expired, reconciling: %s", e)
+                    self.resume_token = None
+                    reconcile = True
+                elif isinstance(e, PyMongoError):
+                    logger.warning("Change stream interrupted, reopening: %s", e)
+                else:
+                    logger.exception("Applying changes failed")
+                await asyncio.sleep(1)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(CHANGE_FEED_POLL_INTERVAL)
+            try:
+                batch = ChangeBatch()
+                for doc in await db.cache_versions.find({}).to_list(None):
+                    if self.versions.get(doc["_id"]) != doc["version"]:
+                        self.versions[doc["_id"]] = doc["version"]
+                        batch.add({"operationType": "update", "ns": {"coll": "cache_versions"},
+                                   "documentKey": {"_id": doc["_id"]}})
+                await self.apply(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Polling for changes failed")
+
+    async def apply(self, batch: ChangeBatch, caches: bool = True):
+        if not batch.size:
+            return
+        self.events += batch.size
+        self.batches += 1
+        self.last_event_at = datetime.now(timezone.utc)
+        if caches:
+            collections = set(CACHED_COLLECTIONS) if batch.everything else batch.collections
+            for collection in collections:
+                invalidate_caches(collection)
+            if "subscription_plans" in collections:
+                await plan_catalog.reload()
+            if "recommendations" not in collections:
+                for user_id in batch.recommendations:
+                    recommendation_cache.discard(user_id)
+        if batch.users_deleted and await self._claim_purge(batch.users_deleted):
+            await purge_orphans()
+
+    async def reconcile(self):
+        # Events were lost: treat everything as changed
+        batch = ChangeBatch()
+        batch.add({"operationType": "invalidate"})
+        await self.apply(batch)
+        await purge_orphans()
+
+    async def _claim_purge(self, cluster_time: Timestamp) -> bool:
+        # Every worker sees the same deletion; the first to claim its cluster time does the purge
+        try:
+            await db.change_feed.update_one(
+                {"_id": "purge_orphans", "through": {"$lt": cluster_time}},
+                {"$set": {"through": cluster_time, "updated_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def _checkpoint(self, force: bool = False):
+        if self.resume_token is None:
+            return
+        if not force and time.monotonic() - self._checkpointed < CHANGE_FEED_CHECKPOINT_INTERVAL:
+            return
+        # Workers may overwrite each other; any recent token resumes close enough to the head
+        await db.change_feed.update_one(
+            {"_id": "stream"},
+            {"$set": {"resume_token": self.resume_token, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+        self._checkpointed = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "events": self.events,
+            "batches": self.batches,
+            "last_event_at": self.last_event_at,
+        }
+
+change_feed = ChangeFeed(CHANGE_FEED_MODE)
+
+# Media
+MEDIA_URL_TTL = int(os.environ.get('MEDIA_URL_TTL_SECONDS', 3600))
+# Hosts that stored source and rendition links may point to; anything else is never redirected to or returned
+MEDIA_ALLOWED_HOSTS = {h.strip().lower() for h in os.environ.get(
+    'MEDIA_ALLOWED_HOSTS', 'images.unsplash.com,storage.googleapis.com'
+).split(',') if h.strip()}
+MAX_MANIFESTS = 20
+
+def media_asset_id(url: str) -> str:
+    # Stable, and computable by the transcoding pipeline from the original link alone
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, url))
+
+def media_source_ops(exercise: dict) -> list:
+    # Each exercise link becomes an asset on import, so its id resolves before any renditions exist
+    now = datetime.now(timezone.utc)
+    return [
+        UpdateOne({"id": exercise[id_field]}, {"$setOnInsert": {
+            "kind": kind, "source_url": exercise[url_field], "renditions": [], "updated_at": now
+        }}, upsert=True)
+        for id_field, url_field, kind in (("video_asset_id", "video_url", "video"), ("thumbnail_asset_id", "thumbnail", "image"))
+    ]
+
+class MediaService:
+    """Rendition metadata from Mongo; URLs are signed per request so cached metadata never holds expired links."""
+
+    def __init__(self, storage: Optional[MediaStorage]):
+        self.storage = storage
+
+    def url(self, rendition: dict) -> Optional[str]:
+        if rendition.get("key") and self.storage:
+            return self.storage.presign(rendition["key"])
+        return self.external_url(rendition.get("url"))
+
+    @staticmethod
+    def external_url(url: Optional[str]) -> Optional[str]:
+        if not url:
+            return None
+        parsed = urlsplit(url)
+        if parsed.scheme != "https" or (parsed.hostname or "").lower() not in MEDIA_ALLOWED_HOSTS:
+            return None
+        return url
+
+    def view(self, rendition: dict, signed: bool = True) -> dict:
+        # Object keys stay internal; clients only ever see signed URLs
+        view = {k: v for k, v in rendition.items() if k not in ("key", "url")}
+        if signed:
+            view["url"] = self.url(rendition)
+        return view
+
+    async def get_many(self, asset_ids: List[str]) -> dict:
+        async def load():
+            docs = await db.media_assets.find({"id": {"$in": asset_ids}}, {"_id": 0}).to_list(len(asset_ids))
+            return {doc["id"]: doc for doc in docs}
+
+        return await response_cache.get_or_load(("media", tuple(sorted(asset_ids))), ["media_assets"], load)
+
+    async def save(self, asset: MediaAsset):
+        await db.media_assets.replace_one({"id": asset.id}, asset.model_dump(), upsert=True)
+        await content_changed("media_assets")
+
+    async def sync(self) -> dict:
+        # Registers every rendition found in the bucket; listing and HEAD requests block, so run off the loop
+        scanned = await asyncio.to_thread(self.storage.scan)
+        now = datetime.now(timezone.utc)
+        ops = []
+        for asset_id, found in scanned.items():
+            kind = "video" if any(r["content_type"].startswith("video/") for r in found["renditions"]) else "image"
+            ops.append(UpdateOne({"id": asset_id}, {"$set": {**found, "kind": kind, "updated_at": now}}, upsert=True))
+        if ops:
+            await db.media_assets.bulk_write(ops, ordered=False)
+            await content_changed("media_assets")
+        report = {"assets": len(ops), "renditions": sum(len(found["renditions"]) for found in scanned.values())}
+        logger.info("Synced %(assets)d media assets with %(renditions)d renditions from storage", report)
+        return report
+
+media_service = MediaService(
+    MediaStorage(
+        os.environ['MEDIA_BUCKET'],
+        prefix=os.environ.get('MEDIA_PREFIX', 'media/'),
+        endpoint_url=os.environ.get('MEDIA_S3_ENDPOINT_URL'),
+        region=os.environ.get('MEDIA_S3_REGION'),
+        url_ttl=MEDIA_URL_TTL
+    ) if os.environ.get('MEDIA_BUCKET') else None
+)
+
+# Catalogue import
+SEED_DATA_DIR = ROOT_DIR / 'seed_data'
+IMPORT_NAMESPACE = uuid.UUID("5b1f6c1e-3f0a-4c8e-9a51-0c6f2b7d9e41")
+
+# collection -> (model, natural key used to derive a stable id)
+IMPORT_SPECS = {
+    "exercises": (Exercise, "name"),
+    "blog_posts": (BlogPost, "title"),
+}
+
+def iter_records(fileobj):
+    # Accepts a JSON array or NDJSON; NDJSON is read one line at a time. A malformed
+    # line is yielded as its ValueError, so the import reports it like any invalid record;
+    # an array is parsed whole, before anything is written
+    first = fileobj.read(1)
+    while first and first.isspace():
+        first = fileobj.read(1)
+    if first in ("[", b"["):
+        yield from json.loads(first + fileobj.read())
+        return
+    pending = first
+    for line in fileobj:
+        line, pending = pending + line, first[:0]
+        if line.strip():
+            try:
+                # Bytes are decoded here, so a line that is not UTF-8 only spoils itself
+                yield json.loads(line)
+            except ValueError as e:
+                yield e
+
+def import_document(collection: str, record: dict, batch_id: str) -> dict:
+    model, natural_key = IMPORT_SPECS[collection]
+    if not isinstance(record, dict):
+        raise TypeError("expected a JSON object")
+    if not record.get("id"):
+        record = {**record, "id": str(uuid.uuid5(IMPORT_NAMESPACE, f"{collection}:{record[natural_key]}"))}
+    doc = model(**record).model_dump()
+    if collection == "exercises":
+        doc['video_asset_id'] = doc['video_asset_id'] or media_asset_id(doc['video_url'])
+        doc['thumbnail_asset_id'] = doc['thumbnail_asset_id'] or media_asset_id(doc['thumbnail'])
+    doc['import_batch'] = batch_id
+    return doc
+
+async def import_records(collection: str, records, batch_size: int = 500, prune: bool = False,
+                         local: bool = True) -> dict:
+    batch_id = str(uuid.uuid4())
+    target = db[collection]
+    report = {"collection": collection, "received": 0, "upserted": 0, "modified": 0,
+              "invalid": 0, "errors": [], "pruned": 0}
+
+    flushed = False
+
+    async def flush(ops, media_ops):
+        nonlocal flushed
+        # Set before writing: an unordered bulk write that fails may still have applied some ops
+        flushed = True
+        result = await target.bulk_write(ops, ordered=False)
+        report["upserted"] += result.upserted_count
+        report["modified"] += result.modified_count
+        if media_ops:
+            await db.media_assets.bulk_write(media_ops, ordered=False)
+
+    try:
+        ops, media_ops = [], []
+        for number, record in enumerate(records, start=1):
+            report["received"] += 1
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                doc = import_document(collection, record, batch_id)
+            except ValidationError as e:
+                report["invalid"] += 1
+                if len(report["errors"]) < 10:
+                    problems = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                    report["errors"].append(f"record {number}: {problems}")
+                continue
+            except ValueError as e:
+                report["invalid"] += 1
+                if len(report["errors"]) < 10:
+                    report["errors"].append(f"record {number}: malformed JSON: {e}")
+                continue
+            except (KeyError, TypeError) as e:
+                report["invalid"] += 1
+                if len(report["errors"]) < 10:
+                    problem = f"missing {e}" if isinstance(e, KeyError) else str(e)
+                    report["errors"].append(f"record {number}: {problem}")
+                continue
+            # Each document is replaced in place, so readers see either the old or the new version
+            ops.append(UpdateOne({"id": doc["id"]}, {"$set": doc}, upsert=True))
+            if collection == "exercises":
+                media_ops.extend(media_source_ops(doc))
+            if len(ops) >= batch_size:
+                await flush(ops, media_ops)
+                ops, media_ops = [], []
+        if ops:
+            await flush(ops, media_ops)
+
+        # Only prune after a clean run, otherwise rejected records would vanish
+        if prune and not report["invalid"]:
+            flushed = True
+            result = await target.delete_many({"import_batch": {"$ne": batch_id}})
+            report["pruned"] = result.deleted_count
+    finally:
+        # A record or write that raises midway leaves earlier batches applied; caches must still drop them
+        if flushed:
+            await content_changed(collection, local)
+            if collection == "exercises":
+                await content_changed("media_assets", local)
+
+    logger.info("Imported %s: %d received, %d upserted, %d modified, %d invalid, %d pruned",
+                collection, report["received"], report["upserted"], report["modified"],
+                report["invalid"], report["pruned"])
+    return report
+
+async def import_file(collection: str, path, batch_size: int = 500, prune: bool = False,
+                      local: bool = True) -> dict:
+    with open(path, "rb") as f:
+        return await import_records(collection, iter_records(f), batch_size, prune, local)
+
+async def migrate_published_at() -> int:
+    # Earlier imports stored published_at as ISO strings, which BSON sorts apart from dates
+    ops = []
+    async for post in db.blog_posts.find({"published_at": {"$type": "string"}}, {"_id": 0, "id": 1, "published_at": 1}):
+        published_at = datetime.fromisoformat(post["published_at"])
+        ops.append(UpdateOne({"id": post["id"]}, {"$set": {"published_at": published_at}}))
+    if ops:
+        await db.blog_posts.bulk_write(ops, ordered=False)
+        await content_changed("blog_posts")
+        logger.info("Converted published_at to BSON dates on %d blog posts", len(ops))
+    return len(ops)
+
+# Indexes ensured at startup, keyed by collection
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "exercises": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("name", ASCENDING), ("id", ASCENDING)], name="name_id"),
+        IndexModel(
+            [("muscle_group", ASCENDING), ("name", ASCENDING), ("id", ASCENDING)],
+            name="muscle_group_name_id"
+        ),
+    ],
+    "blog_posts": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("published_at", DESCENDING), ("id", DESCENDING)], name="published_at_id"),
+    ],
+    "payments": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("idempotency_key", ASCENDING)], name="user_id_idempotency_key", unique=True),
+        IndexModel([("status", ASCENDING), ("updated_at", ASCENDING)], name="status_updated_at"),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "media_assets": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "workouts": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("performed_at", DESCENDING)], name="user_id_performed_at"),
+        IndexModel([("rollup_pending", ASCENDING)], name="rollup_pending", sparse=True),
+    ],
+    "workout_rollups": [
+        # analytics.py drops the analytics rollups its latest run did not rewrite
+        IndexModel([("computed_at", ASCENDING)], name="analytics_computed_at",
+                   partialFilterExpression={"day": "analytics"}),
+    ],
+    "recommendations": [
+        # recommendations.py drops the lists its latest run did not rewrite
+        IndexModel([("computed_at", ASCENDING)], name="computed_at"),
+    ],
+}
+
+async def ensure_indexes() -> dict:
+    report = {}
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        existing = set(await collection.index_information())
+        created, failed = [], []
+        for index in indexes:
+            name = index.document["name"]
+            if name in existing:
+                continue
+            try:
+                await collection.create_indexes([index])
+                created.append(name)
+            except OperationFailure as e:
+                failed.append(name)
+                logger.error("Failed to build index %s.%s: %s", collection_name, name, e)
+        report[collection_name] = {"created": created, "failed": failed}
+        if created:
+            logger.info("Built indexes on %s: %s", collection_name, ", ".join(created))
+    return report
+
+# Pagination helpers
+EXERCISE_SORT = [("name", 1), ("id", 1)]
+BLOG_POST_SORT = [("published_at", -1), ("id", -1)]
+
+# List pages only render the excerpt, so the full markdown body is opt-in
+EXERCISE_LIST_FIELDS = list(Exercise.model_fields)
+BLOG_POST_LIST_FIELDS = [f for f in BlogPost.model_fields if f != "content"]
+
+# Full documents in model shape, without import bookkeeping such as import_batch
+EXERCISE_PROJECTION = {"_id": 0, **{f: 1 for f in Exercise.model_fields}}
+BLOG_POST_PROJECTION = {"_id": 0, **{f: 1 for f in BlogPost.model_fields}}
+
+def parse_fields(fields: Optional[str], model, default: List[str]) -> List[str]:
+    if not fields:
+        return default
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+def encode_cursor(doc: dict, sort) -> str:
+    values = [doc[field] for field, _ in sort]
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+# Sort keys are ids, names and dates; anything else in a cursor, such as a
+# {"$regex": ...} document, would reach Mongo as a query operator
+CURSOR_VALUE_TYPES = (str, int, float, datetime)
+
+def decode_cursor(cursor: str, sort) -> list:
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (
+        not isinstance(values, list) or len(values) != len(sort)
+        or any(isinstance(v, bool) or not isinstance(v, CURSOR_VALUE_TYPES) for v in values)
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def cursor_filter(cursor: str, sort) -> dict:
+    values = decode_cursor(cursor, sort)
+
+    # (a > x) OR (a == x AND b > y) OR ... for the compound sort key
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: v for (f, _), v in zip(sort[:i], values[:i])}
+        clause[field] = {"$gt" if direction == 1 else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+async def fetch_page(collection, query: dict, sort, fields: List[str], limit: int,
+                     cursor: Optional[str]):
+    if cursor:
+        query = {"$and": [query, cursor_filter(cursor, sort)]}
+
+    sort_fields = [field for field, _ in sort]
+    projection = {"_id": 0, **{f: 1 for f in set(fields) | set(sort_fields)}}
+
+    # Fetch one extra document to know whether another page exists
+    docs = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort)
+
+    hidden = set(sort_fields) - set(fields)
+    if hidden:
+        for doc in docs:
+            for field in hidden:
+                doc.pop(field, None)
+    return docs, next_cursor
+
+# NDJSON streaming for bulk consumers such as export jobs
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 500))
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+# Lists answer JSON or NDJSON depending on Accept, so shared caches must key on it
+NEGOTIATED_HEADERS = {"Vary": "Accept"}
+
+def page_headers(next_cursor: Optional[str]) -> dict:
+    return {**NEGOTIATED_HEADERS, "X-Next-Cursor": next_cursor} if next_cursor else NEGOTIATED_HEADERS
+
+def stream_ndjson(collection, sort, fields: List[str], cursor: Optional[str]) -> StreamingResponse:
+    # Streams every document after the cursor, one per line, holding at most one Mongo batch in memory
+    query = cursor_filter(cursor, sort) if cursor else {}
+    docs = collection.find(query, {"_id": 0, **{f: 1 for f in fields}}).sort(sort).batch_size(STREAM_BATCH_SIZE)
+
+    async def lines():
+        chunk = bytearray()
+        async for doc in docs:
+            chunk += dump_json(doc)
+            chunk += b"\n"
+            if len(chunk) >= STREAM_CHUNK_BYTES:
+                yield bytes(chunk)
+                chunk.clear()
+        if chunk:
+            yield bytes(chunk)
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE, headers=NEGOTIATED_HEADERS)
+
 # Auth Endpoints
-@api_router.post("/auth/signup", response_model=User)
+@api_router.post("/auth/signup", response_model=AuthSession, dependencies=[Depends(limit_auth_by_ip)])
 async def signup(user_data: UserCreate):
-    # Check if user exists
-    existing = await db.users.find_one({"email": user_data.email})
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
     # Create user
     user = User(
         email=user_data.email,
@@ -106,244 +2089,450 @@ async def signup(user_data: UserCreate):
     # Store hashed password separately (in real app)
     doc = user.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
-    doc['password_hash'] = pwd_context.hash(user_data.password)
+    doc['password_hash'] = await password_pool.hash(user_data.password)
     
-    await db.users.insert_one(doc)
-    return user
+    # The unique email index rejects duplicates, including concurrent signups
+    try:
+        await db.users.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    return issue_session(user)
 
-@api_router.post("/auth/login", response_model=User)
+@api_router.post("/auth/login", response_model=AuthSession, dependencies=[Depends(limit_auth_by_ip)])
 async def login(credentials: UserLogin):
+    await rate_limiter.check("login_email", credentials.email.lower())
+
     user = await db.users.find_one({"email": credentials.email})
-    if not user:
-        raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Verify password
-    if not pwd_context.verify(credentials.password, user.get('password_hash', '')):
+    # Verify password; unknown emails take the same path to avoid leaking which exist
+    password_hash = user.get('password_hash', DUMMY_PASSWORD_HASH) if user else DUMMY_PASSWORD_HASH
+    if not await password_pool.verify(credentials.password, password_hash) or not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Convert timestamp
     if isinstance(user['created_at'], str):
         user['created_at'] = datetime.fromisoformat(user['created_at'])
     
-    return User(**user)
+    return issue_session(User(**user))
+
+@api_router.post("/auth/refresh", response_model=AuthSession, dependencies=[Depends(limit_auth_by_ip)])
+async def refresh_session(request: RefreshRequest):
+    claims = decode_token(request.refresh_token, "refresh")
+    # Refreshing is the one place the user is re-read, so plan changes show up here
+    user = await db.users.find_one({"id": claims["sub"]}, {"_id": 0, "password_hash": 0})
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if isinstance(user['created_at'], str):
+        user['created_at'] = datetime.fromisoformat(user['created_at'])
+    return issue_session(User(**user))
 
 # Subscription Endpoints
 @api_router.get("/subscriptions/plans", response_model=List[SubscriptionPlan])
-async def get_subscription_plans():
-    plans = [
-        SubscriptionPlan(
-            id="free",
-            name="Ücretsiz",
-            price=0,
-            features=["Blog erişimi", "Hakkımızda erişimi"],
-            has_anatomy=False,
-            has_video_swipe=False
-        ),
-        SubscriptionPlan(
-            id="basic",
-            name="Temel",
-            price=100,
-            features=["Egzersiz modülü", "Kas seçim sistemi", "Temel analizler"],
-            has_anatomy=True,
-            has_video_swipe=False
-        ),
-        SubscriptionPlan(
-            id="advanced",
-            name="Gelişmiş",
-            price=300,
-            features=["Video swipe modülü", "Detaylı analizler", "Dashboard erişimi", "Diyet planları"],
-            has_anatomy=True,
-            has_video_swipe=True
-        ),
-        SubscriptionPlan(
-            id="comprehensive",
-            name="Kapsamlı",
-            price=500,
-            features=["Tüm özellikler", "Kişisel antrenör desteği", "AI öneriler", "Öncelikli destek", "3D kas animasyonları"],
-            has_anatomy=True,
-            has_video_swipe=True
-        )
-    ]
-    return plans
+async def get_subscription_plans(request: Request):
+    return conditional_response(request, plan_catalog.body, plan_catalog.etag, PLANS_MAX_AGE)
+
+@api_router.post("/subscriptions/plans/reload", dependencies=[Depends(require_admin)])
+async def reload_subscription_plans():
+    await change_feed.publish("subscription_plans")
+    await plan_catalog.reload()
+    return {"source": plan_catalog.source, "plans": len(plan_catalog.plans), "etag": plan_catalog.etag}
 
-@api_router.post("/subscriptions/activate")
-async def activate_subscription(payment: PaymentRequest):
-    # Demo payment - always succeeds
+def payment_status(payment: dict) -> dict:
     return {
-        "success": True,
-        "message": "Aboneliğiniz aktif hale geldi",
-        "plan": payment.plan_name
+        "success": payment["status"] != "failed",
+        "payment_id": payment["id"],
+        "status": payment["status"],
+        "plan": payment["plan_name"],
+        "message": {
+            "succeeded": "Aboneliğiniz aktif hale geldi",
+            "failed": "Ödeme başarısız oldu",
+        }.get(payment["status"], "Ödemeniz işleniyor"),
     }
 
+@api_router.post("/subscriptions/activate", status_code=202)
+async def activate_subscription(
+    payment: PaymentRequest,
+    idempotency_key: str = Header(..., alias="Idempotency-Key", min_length=8, max_length=128),
+    user: TokenClaims = Depends(current_user)
+):
+    plan = plan_catalog.by_name.get(payment.plan_name)
+    if not plan:
+        raise HTTPException(status_code=400, detail="Unknown plan")
+
+    record = Payment(
+        user_id=user.sub,
+        idempotency_key=idempotency_key,
+        plan_name=plan.name,
+        amount=plan.price,
+        # Only the last four digits are kept; the full card number and CVV are never stored
+        card_last4=payment.card_number.replace(" ", "")[-4:]
+    )
+    try:
+        await db.payments.insert_one(record.model_dump())
+    except DuplicateKeyError:
+        # A repeated click or retry: report the original attempt instead of charging again
+        existing = await db.payments.find_one(
+            {"user_id": user.sub, "idempotency_key": idempotency_key}, {"_id": 0}
+        )
+        if existing["plan_name"] != plan.name:
+            raise HTTPException(status_code=409, detail="Idempotency key already used for another plan")
+        return payment_status(existing)
+
+    payment_processor.submit(record.id)
+    return payment_status(record.model_dump())
+
+@api_router.get("/subscriptions/payments/{payment_id}")
+async def get_payment(payment_id: str, user: TokenClaims = Depends(current_user)):
+    payment = await db.payments.find_one({"id": payment_id, "user_id": user.sub}, {"_id": 0})
+    if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
+    return payment_status(payment)
+
 # Exercise Endpoints
-@api_router.get("/exercises", response_model=List[Exercise])
-async def get_exercises():
-    exercises = await db.exercises.find({}, {"_id": 0}).to_list(100)
-    return exercises
-
-@api_router.get("/exercises/by-muscle/{muscle_group}", response_model=List[Exercise])
-async def get_exercises_by_muscle(muscle_group: str):
-    exercises = await db.exercises.find(
-        {"muscle_group": muscle_group},
-        {"_id": 0}
-    ).to_list(50)
-    return exercises
+# The whole exercise catalogue, including video links, belongs to plans with has_anatomy
+@api_router.get("/exercises", dependencies=[Depends(require_feature("has_anatomy"))])
+async def get_exercises(
+    request: Request,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    projection = parse_fields(fields, Exercise, EXERCISE_LIST_FIELDS)
+    if wants_ndjson(request):
+        return stream_ndjson(catalog_db.exercises, EXERCISE_SORT, projection, cursor)
+
+    async def load():
+        exercises, next_cursor = await fetch_page(
+            db.exercises, {}, EXERCISE_SORT, projection, limit, cursor
+        )
+        return exercises, page_headers(next_cursor)
+
+    return await cached_json(
+        request, ("exercises", limit, cursor, tuple(projection)), ["exercises"], load, private=True
+    )
+
+@api_router.get("/exercises/by-muscle", response_model=Dict[str, List[Exercise]],
+                dependencies=[Depends(require_feature("has_anatomy"))])
+async def get_exercises_by_muscles(
+    request: Request,
+    groups: str,
+    limit: int = Query(50, ge=1, le=100)
+):
+    # Several body-map regions in one request and one aggregation, grouped by muscle
+    muscle_groups = list(dict.fromkeys(g.strip() for g in groups.split(",") if g.strip()))
+    if not muscle_groups or len(muscle_groups) > MAX_BATCH_GROUPS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {MAX_BATCH_GROUPS} groups are required")
+
+    async def load():
+        grouped = {group: [] for group in muscle_groups}
+        # Sorted like the muscle_group_name_id index, so Mongo walks it instead of sorting;
+        # $firstN (MongoDB 5.2+) keeps only `limit` exercises per group while grouping,
+        # instead of collecting every exercise of the group and slicing afterwards
+        cursor = db.exercises.aggregate([
+            {"$match": {"muscle_group": {"$in": muscle_groups}}},
+            {"$sort": dict([("muscle_group", 1), *EXERCISE_SORT])},
+            {"$project": EXERCISE_PROJECTION},
+            {"$group": {"_id": "$muscle_group", "exercises": {"$firstN": {"input": "$$ROOT", "n": limit}}}},
+        ])
+        async for group in cursor:
+            grouped[group["_id"]] = group["exercises"]
+        return grouped, None
+
+    return await cached_json(
+        request, ("exercises/by-muscle", tuple(muscle_groups), limit), ["exercises"], load, private=True
+    )
+
+@api_router.get("/exercises/by-muscle/{muscle_group}", response_model=List[Exercise],
+                dependencies=[Depends(require_feature("has_anatomy"))])
+async def get_exercises_by_muscle(request: Request, muscle_group: str):
+    async def load():
+        # Documents were validated on import; the projection already gives the Exercise shape
+        exercises = await db.exercises.find(
+            {"muscle_group": muscle_group},
+            EXERCISE_PROJECTION
+        ).to_list(50)
+        return exercises, None
+
+    return await cached_json(
+        request, ("exercises/by-muscle", muscle_group), ["exercises"], load, private=True
+    )
+
+# Media Endpoints
+@api_router.post("/media/assets", response_model=MediaAsset, dependencies=[Depends(require_admin)])
+async def register_media_asset(asset: MediaAsset):
+    await media_service.save(asset)
+    return asset
+
+@api_router.post("/media/sync", dependencies=[Depends(require_admin)])
+async def sync_media_assets():
+    if not media_service.storage:
+        raise HTTPException(status_code=503, detail="Media storage is not configured")
+    return await media_service.sync()
+
+@api_router.get("/media/assets/{asset_id}")
+async def get_media_asset(asset_id: str):
+    asset = (await media_service.get_many([asset_id])).get(asset_id)
+    if not asset:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    # Returned directly so stored datetimes keep their UTC offset (see JSON_OPTIONS)
+    return FastJSONResponse({**asset, "renditions": [media_service.view(r, signed=False) for r in asset["renditions"]]})
+
+@api_router.get("/media/thumbnails/{asset_id}")
+async def get_thumbnail(
+    asset_id: str,
+    width: int = Query(400, ge=16, le=4096),
+    dpr: float = Query(1, ge=1, le=4)
+):
+    asset = (await media_service.get_many([asset_id])).get(asset_id)
+    if not asset:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    images = [r for r in asset["renditions"] if r["content_type"].startswith("image/")]
+    rendition = smallest_covering(images, round(width * dpr))
+    url = media_service.url(rendition) if rendition else media_service.external_url(asset.get("source_url"))
+    if not url:
+        raise HTTPException(status_code=404, detail="Asset has no images")
+    # The browser may reuse the redirect for as long as the signed URL stays comfortably valid
+    return RedirectResponse(url, status_code=307, headers={"Cache-Control": f"private, max-age={MEDIA_URL_TTL // 2}"})
+
+@api_router.get("/media/videos/manifests", dependencies=[Depends(require_feature("has_anatomy"))])
+async def get_video_manifests(
+    ids: str,
+    max_height: Optional[int] = Query(None, ge=1),
+    bandwidth_kbps: Optional[int] = Query(None, ge=1)
+):
+    # Several ids per call so the swipe view can fetch the current and next videos together
+    asset_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if not asset_ids or len(asset_ids) > MAX_MANIFESTS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {MAX_MANIFESTS} ids are required")
+
+    assets = await media_service.get_many(asset_ids)
+    manifests = []
+    for asset_id in asset_ids:
+        asset = assets.get(asset_id)
+        if not asset:
+            continue
+        videos = [r for r in asset["renditions"] if r["content_type"].startswith("video/")]
+        renditions = [media_service.view(r) for r in videos]
+        recommended = best_fitting(renditions, max_height, bandwidth_kbps)
+        manifests.append({
+            "asset_id": asset_id,
+            "duration_seconds": asset.get("duration_seconds"),
+            "renditions": renditions,
+            "recommended": recommended["label"] if recommended else None,
+            "url": recommended["url"] if recommended else media_service.external_url(asset.get("source_url")),
+        })
+    return manifests
 
 # Blog Endpoints
-@api_router.get("/blog/posts", response_model=List[BlogPost])
-async def get_blog_posts():
-    posts = await db.blog_posts.find({}, {"_id": 0}).to_list(100)
-    for post in posts:
-        if isinstance(post['published_at'], str):
-            post['published_at'] = datetime.fromisoformat(post['published_at'])
-    return posts
+@api_router.get("/blog/posts")
+async def get_blog_posts(
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    projection = parse_fields(fields, BlogPost, BLOG_POST_LIST_FIELDS)
+    if wants_ndjson(request):
+        return stream_ndjson(catalog_db.blog_posts, BLOG_POST_SORT, projection, cursor)
+
+    async def load():
+        posts, next_cursor = await fetch_page(
+            db.blog_posts, {}, BLOG_POST_SORT, projection, limit, cursor
+        )
+        return posts, page_headers(next_cursor)
+
+    return await cached_json(
+        request, ("blog/posts", limit, cursor, tuple(projection)), ["blog_posts"], load
+    )
 
 @api_router.get("/blog/post/{post_id}", response_model=BlogPost)
-async def get_blog_post(post_id: str):
-    post = await db.blog_posts.find_one({"id": post_id}, {"_id": 0})
-    if not post:
+async def get_blog_post(request: Request, post_id: str):
+    async def load():
+        post = await db.blog_posts.find_one({"id": post_id}, BLOG_POST_PROJECTION)
+        return post, None
+
+    # Misses are cached too, so unknown ids do not reach Mongo on every call
+    response = await cached_json(request, ("blog/post", post_id), ["blog_posts"], load)
+    if response is None:
         raise HTTPException(status_code=404, detail="Post not found")
-    if isinstance(post['published_at'], str):
-        post['published_at'] = datetime.fromisoformat(post['published_at'])
-    return BlogPost(**post)
+    return response
+
+# Search Endpoints
+@api_router.get("/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: Optional[str] = Query(None, pattern="^(exercise|blog_post)$"),
+    muscle_group: Optional[str] = None,
+    difficulty: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    user: Optional[TokenClaims] = Depends(optional_user)
+):
+    # Exercises are only found by plans that include them; everyone else searches the blog
+    if not (user and user.has_anatomy):
+        if type == "exercise":
+            raise HTTPException(status_code=403, detail="Your subscription plan does not include this feature")
+        type = "blog_post"
+    index = await search_service.get()
+    started = time.perf_counter()
+    result = index.search(
+        q,
+        filters={"type": type, "muscle_group": muscle_group, "difficulty": difficulty},
+        limit=limit,
+        offset=offset
+    )
+    return {
+        "query": q,
+        **result,
+        "took_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+# Workout Endpoints
+@api_router.post("/workouts", response_model=Workout)
+async def log_workout(workout_data: WorkoutCreate, user: TokenClaims = Depends(current_user)):
+    if workout_data.muscle_group not in MUSCLE_GROUPS:
+        raise HTTPException(status_code=400, detail="Unknown muscle group")
+
+    workout = Workout(user_id=user.sub, **workout_data.model_dump(exclude_none=True))
+    await db.workouts.insert_one({**workout.model_dump(), "rollup_pending": datetime.now(timezone.utc)})
+    await apply_rollups(workout)
+    return workout
 
 # Dashboard Endpoints
 @api_router.get("/dashboard/stats", response_model=DashboardStats)
-async def get_dashboard_stats():
+async def get_dashboard_stats(user: TokenClaims = Depends(current_user)):
+    user_id = user.sub
+    today = datetime.now(timezone.utc).date()
+    days = [today - timedelta(days=offset) for offset in range(6, -1, -1)]
+    keys = ["total", "analytics"] + [day.isoformat() for day in days]
+    ids = [rollup_id(user_id, key) for key in keys]
+
+    # One _id lookup covering the lifetime totals, the last seven days and
+    # the latest batch analytics (see analytics.py)
+    rollups = {
+        doc["day"]: doc
+        for doc in await db.workout_rollups.find({"_id": {"$in": ids}}, {"applied": 0}).to_list(len(ids))
+    }
+    total = rollups.get("total", {})
+    analytics = rollups.get("analytics", {})
+
     return DashboardStats(
-        total_workouts=42,
-        total_duration="18.5 saat",
-        calories_burned=8420,
-        muscle_balance=87,
+        total_workouts=total.get("workouts", 0),
+        total_duration=f"{total.get('duration_minutes', 0) / 60:.1f} saat",
+        calories_burned=total.get("calories", 0),
+        # Prefer the recent-window score; fall back to lifetime totals until the job has run
+        muscle_balance=analytics.get("muscle_balance", muscle_balance_score(total.get("muscles", {}))),
         weekly_progress=[
-            {"day": "Pzt", "value": 65},
-            {"day": "Sal", "value": 78},
-            {"day": "Çar", "value": 82},
-            {"day": "Per", "value": 71},
-            {"day": "Cum", "value": 90},
-            {"day": "Cmt", "value": 85},
-            {"day": "Paz", "value": 73}
-        ]
+            {
+                "day": WEEKDAY_LABELS[day.weekday()],
+                "value": rollups.get(day.isoformat(), {}).get("duration_minutes", 0)
+            }
+            for day in days
+        ],
+        weekly_trend=analytics.get("weekly_trend", [])
     )
 
+# Recommendation Endpoints
+@api_router.get("/recommendations")
+async def get_recommendations(
+    limit: int = Query(10, ge=1, le=50),
+    user: TokenClaims = Depends(require_feature("has_recommendations"))
+):
+    return FastJSONResponse(await recommend(user.sub, limit))
+
+# Import Endpoints
+@api_router.post("/import/{collection}", dependencies=[Depends(require_admin)])
+async def import_collection(
+    collection: str,
+    file: UploadFile,
+    batch_size: int = Query(500, ge=1, le=5000),
+    prune: bool = False
+):
+    if collection not in IMPORT_SPECS:
+        raise HTTPException(status_code=404, detail="Unknown collection")
+    try:
+        return await import_records(collection, iter_records(file.file), batch_size, prune)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed import file: {e}")
+
 # Seed data endpoint
-@api_router.post("/seed-data")
+@api_router.post("/seed-data", dependencies=[Depends(require_admin)])
 async def seed_database():
-    # Seed exercises
-    exercises_data = [
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Bench Press",
-            "muscle_group": "Göğüs",
-            "difficulty": "Orta",
-            "duration": "3x12",
-            "description": "Göğüs kaslarını geliştiren temel hareket",
-            "video_url": "https://storage.googleapis.com/gtv-videos-bucket/sample/ForBiggerBlazes.mp4",
-            "thumbnail": "https://images.unsplash.com/photo-1571019613454-1cb2f99b2d8b?w=400"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Deadlift",
-            "muscle_group": "Sırt",
-            "difficulty": "İleri",
-            "duration": "4x8",
-            "description": "Tüm vücudu çalıştıran compound hareket",
-            "video_url": "https://storage.googleapis.com/gtv-videos-bucket/sample/ForBiggerEscapes.mp4",
-            "thumbnail": "https://images.unsplash.com/photo-1605296867304-46d5465a13f1?w=400"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Squat",
-            "muscle_group": "Bacak",
-            "difficulty": "Orta",
-            "duration": "4x10",
-            "description": "Bacak kaslarını güçlendiren temel hareket",
-            "video_url": "https://storage.googleapis.com/gtv-videos-bucket/sample/ForBiggerJoyrides.mp4",
-            "thumbnail": "https://images.unsplash.com/photo-1574680096145-d05b474e2155?w=400"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Shoulder Press",
-            "muscle_group": "Omuz",
-            "difficulty": "Başlangıç",
-            "duration": "3x15",
-            "description": "Omuz kaslarını şekillendiren hareket",
-            "video_url": "https://storage.googleapis.com/gtv-videos-bucket/sample/ForBiggerMeltdowns.mp4",
-            "thumbnail": "https://images.unsplash.com/photo-1583454110551-21f2fa2afe61?w=400"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Bicep Curl",
-            "muscle_group": "Kol",
-            "difficulty": "Başlangıç",
-            "duration": "3x12",
-            "description": "Biceps kaslarını geliştiren izolasyon hareketi",
-            "video_url": "https://storage.googleapis.com/gtv-videos-bucket/sample/ForBiggerFun.mp4",
-            "thumbnail": "https://images.unsplash.com/photo-1581009146145-b5ef050c2e1e?w=400"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Plank",
-            "muscle_group": "Karın",
-            "difficulty": "Başlangıç",
-            "duration": "3x60sn",
-            "description": "Core kaslarını güçlendiren statik hareket",
-            "video_url": "https://storage.googleapis.com/gtv-videos-bucket/sample/ElephantsDream.mp4",
-            "thumbnail": "https://images.unsplash.com/photo-1571019614242-c5c5dee9f50b?w=400"
-        }
+    # Re-running is safe: ids are derived from natural keys, so existing
+    # exercise and post URLs stay valid and readers never see an empty catalogue
+    reports = [
+        await import_file(collection, SEED_DATA_DIR / f"{collection}.ndjson", prune=True)
+        for collection in IMPORT_SPECS
     ]
-    
-    await db.exercises.delete_many({})
-    await db.exercises.insert_many(exercises_data)
-    
-    # Seed blog posts
-    blog_posts = [
-        {
-            "id": str(uuid.uuid4()),
-            "title": "Spor Biliminin Temelleri",
-            "excerpt": "Modern spor bilimi nasıl çalışır? Biyomekanik, fizyoloji ve performans optimizasyonunun temellerini keşfedin.",
-            "content": "# Spor Biliminin Temelleri\n\nSpor bilimi, atletik performansı optimize etmek için fizyoloji, biyomekanik, psikoloji ve beslenme bilimlerini birleştirir.\n\n## Biyomekanik Analiz\n\nHareket paternlerinin analizi, yaralanmaları önlemeye ve performansı artırmaya yardımcı olur.\n\n## Fizyolojik Adaptasyonlar\n\nDüzenli antrenman, kas liflerinde, kardiyovasküler sistemde ve sinir sisteminde adaptasyonlara yol açar.",
-            "image": "https://images.unsplash.com/photo-1576678927484-cc907957088c?w=800",
-            "author": "Dr. Ahmet Yılmaz",
-            "published_at": datetime.now(timezone.utc).isoformat(),
-            "read_time": "8 dakika"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "title": "Kas Aktivasyonu ve EMG Analizi",
-            "excerpt": "Elektromiyografi (EMG) ile kas aktivasyonunu nasıl ölçüyoruz? Bilimsel yaklaşımlar ve pratik uygulamalar.",
-            "content": "# Kas Aktivasyonu ve EMG Analizi\n\nEMG, kas kasılması sırasında üretilen elektriksel aktiviteyi ölçer.\n\n## Uygulama Alanları\n\n- Hareket analizi\n- Rehabilitasyon takibi\n- Antrenman optimizasyonu\n\n## Yorumlama\n\nEMG sinyalleri, hangi kasların ne zaman ve ne kadar aktif olduğunu gösterir.",
-            "image": "https://images.unsplash.com/photo-1571902943202-507ec2618e8f?w=800",
-            "author": "Prof. Ayşe Demir",
-            "published_at": datetime.now(timezone.utc).isoformat(),
-            "read_time": "6 dakika"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "title": "Fizyoterapi ve Biyomekanik",
-            "excerpt": "Yaralanma sonrası iyileşme sürecinde biyomekaniğin rolü nedir? Kanıta dayalı fizyoterapi yaklaşımları.",
-            "content": "# Fizyoterapi ve Biyomekanik\n\nFizyoterapi, hareket bozukluklarını düzeltmek ve fonksiyonu restore etmek için biyomekanik prensipleri kullanır.\n\n## Hareket Analizi\n\nYanlış hareket paternleri tespit edilir ve düzeltilir.\n\n## Rehabilitasyon Protokolleri\n\nBilimsel kanıtlara dayalı, kademeli yükleme programları uygulanır.",
-            "image": "https://images.unsplash.com/photo-1581009146145-b5ef050c2e1e?w=800",
-            "author": "Ft. Mehmet Kaya",
-            "published_at": datetime.now(timezone.utc).isoformat(),
-            "read_time": "10 dakika"
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "title": "Performans Optimizasyonu",
-            "excerpt": "Bilimsel yöntemlerle performansınızı nasıl maksimize edebilirsiniz? Data-driven antrenman yaklaşımları.",
-            "content": "# Performans Optimizasyonu\n\nModern teknoloji ve bilimsel metotlar ile performans artışı sağlanabilir.\n\n## Veri Toplama\n\nGiyilebilir teknolojiler ve laboratuvar testleri ile objektif veriler elde edilir.\n\n## Analiz ve Uygulama\n\nVeriler analiz edilerek kişiye özel antrenman programları oluşturulur.",
-            "image": "https://images.unsplash.com/photo-1517836357463-d25dfeac3438?w=800",
-            "author": "Dr. Zeynep Öztürk",
-            "published_at": datetime.now(timezone.utc).isoformat(),
-            "read_time": "7 dakika"
-        }
-    ]
-    
-    await db.blog_posts.delete_many({})
-    await db.blog_posts.insert_many(blog_posts)
-    
-    return {"message": "Database seeded successfully"}
+    return {"message": "Database seeded successfully", "imports": reports}
+
+# Metrics Endpoints
+@api_router.get("/metrics/password-pool", dependencies=[Depends(require_admin)])
+async def get_password_pool_metrics():
+    return password_pool.stats()
+
+@api_router.get("/metrics/rate-limit", dependencies=[Depends(require_admin)])
+async def get_rate_limit_metrics():
+    return rate_limiter.stats()
+
+@api_router.get("/metrics/db", dependencies=[Depends(require_admin)])
+async def get_db_metrics():
+    return pool_metrics.stats()
+
+@api_router.get("/metrics/search", dependencies=[Depends(require_admin)])
+async def get_search_metrics():
+    index = search_service.index
+    return {
+        "documents": index.size if index else 0,
+        "terms": len(index.vocabulary) if index else 0,
+        "rebuilds": search_service.rebuilds,
+        "last_build_ms": search_service.last_build_ms,
+    }
+
+@api_router.get("/metrics/cache", dependencies=[Depends(require_admin)])
+async def get_cache_metrics():
+    return response_cache.stats()
+
+@api_router.get("/metrics/change-feed", dependencies=[Depends(require_admin)])
+async def get_change_feed_metrics():
+    return change_feed.stats()
+
+@api_router.get("/metrics/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles(
+    route: Optional[str] = None,
+    min_ms: float = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500)
+):
+    # Newest first; route is the template, e.g. /api/blog/posts
+    return {"enabled": PROFILING, "kept": profile_buffer.kept, "traces": profile_buffer.list(route, min_ms, limit)}
+
+@api_router.get("/metrics/profiles/{trace_id}", dependencies=[Depends(require_admin)])
+async def get_profile(trace_id: str):
+    trace = profile_buffer.get(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found or already rotated out")
+    return trace.to_dict()
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+# Health Endpoints
+@app.get("/healthz", include_in_schema=False)
+async def liveness():
+    # No dependency checks: a Mongo outage should fail readiness, not restart the worker
+    return {"status": "alive", "pid": os.getpid()}
+
+@app.get("/readyz", include_in_schema=False)
+async def readiness():
+    if not getattr(app.state, "ready", False):
+        status = "draining" if getattr(app.state, "draining", False) else "starting"
+        return FastJSONResponse({"status": status}, status_code=503)
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), READINESS_TIMEOUT)
+    except (asyncio.TimeoutError, PyMongoError):
+        return FastJSONResponse({"status": "mongo unavailable"}, status_code=503)
+    return {"status": "ready", "pid": os.getpid()}
 
 # Include router
 app.include_router(api_router)
@@ -354,14 +2543,68 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+    encodings=[e.strip() for e in os.environ.get('COMPRESSION_ENCODINGS', 'br,gzip').split(',') if e.strip()],
+    gzip_level=int(os.environ.get('GZIP_LEVEL', 6)),
+    brotli_quality=int(os.environ.get('BROTLI_QUALITY', 4)),
+)
+app.add_middleware(MetricsMiddleware)
+# Outermost, so a trace covers compression and the other middleware too
+if PROFILING:
+    app.add_middleware(
+        ProfilerMiddleware,
+        buffer=profile_buffer,
+        # The header carries the admin token: the profiled request keeps its own Authorization
+        authorize=is_admin_token,
+        sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+        slow_ms=float(os.environ.get('PROFILE_SLOW_MS', 0)),
+        header=os.environ.get('PROFILE_HEADER', 'X-Profile'),
+    )
+
+@metrics_registry.collector
+def collect_component_metrics():
+    # Snapshots of the counters each component already keeps; cumulative ones are
+    # exposed as counters so rate() and increase() handle process restarts
+    metrics = []
+
+    def gauge(name, documentation, values):
+        metric = Gauge(name, documentation)
+        for labels, value in values:
+            metric.set(value, **labels)
+        metrics.append(metric)
+
+    def counter(name, documentation, values):
+        metric = Counter(name, documentation)
+        for labels, value in values:
+            metric.inc(value, **labels)
+        metrics.append(metric)
+
+    cache = response_cache.stats()
+    counter("response_cache_events_total", "Response cache hits, misses, evictions, expirations and invalidations",
+          [({"event": e}, cache[e]) for e in ("hits", "misses", "evictions", "expirations", "invalidations")])
+    gauge("response_cache_entries", "Entries in the response cache", [({}, cache["entries"])])
+
+    passwords = password_pool.stats()
+    gauge("password_pool_jobs", "bcrypt jobs running or queued",
+          [({"state": "running"}, passwords["in_flight"]), ({"state": "queued"}, passwords["queued"])])
+    counter("password_pool_rejected_total", "bcrypt jobs rejected with 503", [({}, passwords["rejected"])])
+
+    pool = pool_metrics.stats()
+    gauge("mongo_pool_connections", "MongoDB connections by state",
+          [({"state": "open"}, pool["open_connections"]), ({"state": "checked_out"}, pool["checked_out"])])
+    gauge("mongo_pool_checkout_wait_seconds_max", "Longest MongoDB connection check-out wait", [({}, pool["wait_max_ms"] / 1000)])
+
+    counter("rate_limit_decisions_total", "Rate limiter decisions by scope and outcome",
+          [({"scope": scope, "outcome": "allowed"}, n) for scope, n in rate_limiter.allowed.items()]
+          + [({"scope": scope, "outcome": "rejected"}, n) for scope, n in rate_limiter.rejected.items()])
+    return metrics
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
-logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+logger = logging.getLogger(__name__)
\ No newline at end of file
@@ -1,6 +1,9 @@
+import os
 import requests
 import sys
 import json
+import time
+import uuid
 from datetime import datetime
 
 class BYKLabAPITester:
@@ -9,6 +12,7 @@ class BYKLabAPITester:
         self.tests_run = 0
         self.tests_passed = 0
         self.test_results = []
+        self.session = None
 
     def log_test(self, name, success, details=""):
         """Log test result"""
@@ -29,6 +33,11 @@ class BYKLabAPITester:
         if details:
             print(f"    Details: {details}")
 
+    def auth_headers(self, **extra):
+        """Headers carrying the signed-in user's access token"""
+        token = self.session["access_token"] if self.session else ""
+        return {'Content-Type': 'application/json', 'Authorization': f"Bearer {token}", **extra}
+
     def run_test(self, name, method, endpoint, expected_status, data=None, headers=None):
         """Run a single API test"""
         url = f"{self.base_url}/{endpoint}"
@@ -91,10 +100,26 @@ class BYKLabAPITester:
                 200,
                 data={"email": test_user["email"], "password": test_user["password"]}
             )
+            if login_success:
+                self.session = login_data
             return login_data if login_success else None
         
         return None
 
+    def test_entitlement_gating(self):
+        """Test that gated endpoints need a session and a plan with the feature"""
+        print("\n🔒 Testing Entitlement Gating...")
+
+        for endpoint in ["api/exercises", "api/exercises/by-muscle/Göğüs", "api/dashboard/stats"]:
+            self.run_test(f"Anonymous {endpoint}", "GET", endpoint, 401)
+
+        if not self.session:
+            return
+        # The free plan has no anatomy module
+        self.run_test("Free plan exercises", "GET", "api/exercises", 403, headers=self.auth_headers())
+        self.run_test("Free plan exercises by muscle", "GET", "api/exercises/by-muscle/Göğüs", 403,
+                      headers=self.auth_headers())
+
     def test_subscription_endpoints(self):
         """Test subscription-related endpoints"""
         print("\n💳 Testing Subscription Endpoints...")
@@ -117,12 +142,46 @@ class BYKLabAPITester:
         }
         
         self.run_test(
+            "Activate Subscription without Idempotency-Key",
+            "POST",
+            "api/subscriptions/activate",
+            422,
+            data=payment_data,
+            headers=self.auth_headers()
+        )
+
+        success, payment = self.run_test(
             "Activate Subscription (Demo Payment)",
             "POST",
             "api/subscriptions/activate",
+            202,
+            data=payment_data,
+            headers=self.auth_headers(**{'Idempotency-Key': str(uuid.uuid4())})
+        )
+        if not success or not self.session:
+            return
+
+        # Payments are charged in the background; poll until the outcome is known
+        status = payment.get("status")
+        for _ in range(30):
+            if status not in ("pending", "processing"):
+                break
+            time.sleep(1)
+            response = requests.get(f"{self.base_url}/api/subscriptions/payments/{payment['payment_id']}",
+                                    headers=self.auth_headers(), timeout=10)
+            status = response.json().get("status") if response.status_code == 200 else None
+        self.log_test("Payment Succeeded", status == "succeeded", f"Status: {status}")
+
+        # The access token carries the plan, so a refreshed one picks up the new entitlements
+        success, session = self.run_test(
+            "Refresh Session",
+            "POST",
+            "api/auth/refresh",
             200,
-            data=payment_data
+            data={"refresh_token": self.session["refresh_token"]}
         )
+        if success:
+            self.session = session
 
     def test_exercise_endpoints(self):
         """Test exercise-related endpoints"""
@@ -133,7 +192,8 @@ class BYKLabAPITester:
             "Get All Exercises",
             "GET",
             "api/exercises",
-            200
+            200,
+            headers=self.auth_headers()
         )
         
         # Test get exercises by muscle group
@@ -143,7 +203,8 @@ class BYKLabAPITester:
                 f"Get Exercises for {muscle}",
                 "GET",
                 f"api/exercises/by-muscle/{muscle}",
-                200
+                200,
+                headers=self.auth_headers()
             )
 
     def test_blog_endpoints(self):
@@ -178,7 +239,8 @@ class BYKLabAPITester:
             "Get Dashboard Stats",
             "GET",
             "api/dashboard/stats",
-            200
+            200,
+            headers=self.auth_headers()
         )
 
     def test_seed_data(self):
@@ -189,7 +251,11 @@ class BYKLabAPITester:
             "Seed Database",
             "POST",
             "api/seed-data",
-            200
+            200,
+            headers={
+                'Content-Type': 'application/json',
+                'Authorization': f"Bearer {os.environ.get('ADMIN_TOKEN', '')}"
+            }
         )
 
     def run_all_tests(self):
@@ -203,7 +269,8 @@ class BYKLabAPITester:
         # Test authentication
         user_data = self.test_auth_endpoints()
         
-        # Test other endpoints
+        # Test other endpoints; exercises need the plan bought in the subscription tests
+        self.test_entitlement_gating()
         self.test_subscription_endpoints()
         self.test_exercise_endpoints()
         self.test_blog_endpoints()
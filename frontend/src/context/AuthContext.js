@@ -1,7 +1,13 @@
 import React, { createContext, useContext, useState, useEffect } from 'react';
+import axios from 'axios';
+
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const STORAGE_KEY = 'byklab_user';
 
 const AuthContext = createContext(null);
 
+const readStoredUser = () => JSON.parse(localStorage.getItem(STORAGE_KEY) || 'null');
+
 export const useAuth = () => {
   const context = useContext(AuthContext);
   if (!context) {
@@ -16,27 +22,73 @@ export const AuthProvider = ({ children }) => {
 
   useEffect(() => {
     // Load user from localStorage
-    const storedUser = localStorage.getItem('byklab_user');
+    const storedUser = readStoredUser();
     if (storedUser) {
-      setUser(JSON.parse(storedUser));
+      setUser(storedUser);
     }
     setLoading(false);
   }, []);
 
+  useEffect(() => {
+    // Attach the access token to every API call
+    const requestInterceptor = axios.interceptors.request.use((config) => {
+      const storedUser = readStoredUser();
+      if (storedUser?.access_token) {
+        config.headers.Authorization = `Bearer ${storedUser.access_token}`;
+      }
+      return config;
+    });
+
+    // On an expired access token, refresh once and replay the request
+    const responseInterceptor = axios.interceptors.response.use(
+      (response) => response,
+      async (error) => {
+        const original = error.config;
+        const storedUser = readStoredUser();
+        if (
+          error.response?.status !== 401 ||
+          !storedUser?.refresh_token ||
+          !original ||
+          original._retried ||
+          original.url.includes('/api/auth/')
+        ) {
+          return Promise.reject(error);
+        }
+
+        original._retried = true;
+        try {
+          const response = await axios.post(`${BACKEND_URL}/api/auth/refresh`, {
+            refresh_token: storedUser.refresh_token
+          });
+          login(response.data);
+          return axios(original);
+        } catch (refreshError) {
+          logout();
+          return Promise.reject(error);
+        }
+      }
+    );
+
+    return () => {
+      axios.interceptors.request.eject(requestInterceptor);
+      axios.interceptors.response.eject(responseInterceptor);
+    };
+  }, []);
+
   const login = (userData) => {
     setUser(userData);
-    localStorage.setItem('byklab_user', JSON.stringify(userData));
+    localStorage.setItem(STORAGE_KEY, JSON.stringify(userData));
   };
 
   const logout = () => {
     setUser(null);
-    localStorage.removeItem('byklab_user');
+    localStorage.removeItem(STORAGE_KEY);
   };
 
   const updateSubscription = (planName) => {
     const updatedUser = { ...user, subscription_plan: planName };
     setUser(updatedUser);
-    localStorage.setItem('byklab_user', JSON.stringify(updatedUser));
+    localStorage.setItem(STORAGE_KEY, JSON.stringify(updatedUser));
   };
 
   const hasAccess = (feature) => {
@@ -8,12 +8,21 @@ import { useAuth } from '@/context/AuthContext';
 import { toast } from 'sonner';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const VIDEO_HEIGHT = 600;
+
+const thumbnailUrl = (exercise) => {
+  if (!exercise.thumbnail_asset_id) return exercise.thumbnail;
+  const dpr = Math.min(window.devicePixelRatio || 1, 4);
+  return `${BACKEND_URL}/api/media/thumbnails/${exercise.thumbnail_asset_id}?width=${VIDEO_HEIGHT}&dpr=${dpr}`;
+};
 
 const Anatomy = () => {
   const [gender, setGender] = useState('male');
   const [selectedMuscle, setSelectedMuscle] = useState(null);
   const [exercises, setExercises] = useState([]);
   const [currentVideoIndex, setCurrentVideoIndex] = useState(0);
+  const [manifests, setManifests] = useState({});
+  const [exercisesByGroup, setExercisesByGroup] = useState({});
   const [loading, setLoading] = useState(false);
   const { hasAccess } = useAuth();
 
@@ -26,13 +35,64 @@ const Anatomy = () => {
     { id: 'Bacak', name: 'Bacak', x: 42, y: 50, width: 16, height: 25 }
   ];
 
+  // Preload every region of the body map in one request; clicks then need no round trip
+  const canPreload = hasAccess('anatomy');
+  useEffect(() => {
+    if (!canPreload) return;
+    axios.get(`${BACKEND_URL}/api/exercises/by-muscle`, {
+      params: { groups: muscleGroups.map((muscle) => muscle.id).join(',') },
+    })
+      .then((response) => setExercisesByGroup(response.data))
+      .catch((error) => console.error('Failed to preload exercises:', error));
+  }, [canPreload]);
+
   useEffect(() => {
     if (selectedMuscle) {
       fetchExercises(selectedMuscle);
     }
   }, [selectedMuscle]);
 
+  // Load video manifests for the current and next exercise together, so the next video can be prefetched
+  useEffect(() => {
+    const wanted = exercises
+      .slice(currentVideoIndex, currentVideoIndex + 2)
+      .map((exercise) => exercise.video_asset_id)
+      .filter((id) => id && !(id in manifests));
+    if (wanted.length === 0) return;
+
+    const dpr = window.devicePixelRatio || 1;
+    const downlink = navigator.connection?.downlink;
+    const params = {
+      ids: wanted.join(','),
+      max_height: Math.round(VIDEO_HEIGHT * dpr),
+      ...(downlink ? { bandwidth_kbps: Math.round(downlink * 1000) } : {}),
+    };
+    axios.get(`${BACKEND_URL}/api/media/videos/manifests`, { params })
+      .then((response) => response.data)
+      .catch(() => [])
+      .then((loaded) => {
+        setManifests((previous) => {
+          // Ids without a manifest fall back to the raw video_url and are not requested again
+          const next = { ...previous, ...Object.fromEntries(wanted.map((id) => [id, null])) };
+          loaded.forEach((manifest) => { next[manifest.asset_id] = manifest; });
+          return next;
+        });
+      });
+  }, [exercises, currentVideoIndex, manifests]);
+
+  // Wait for the manifest before setting src, otherwise the raw video starts downloading first
+  const videoUrl = (exercise) => {
+    const id = exercise.video_asset_id;
+    if (id && !(id in manifests)) return undefined;
+    return manifests[id]?.url || exercise.video_url;
+  };
+
   const fetchExercises = async (muscleGroup) => {
+    if (exercisesByGroup[muscleGroup]) {
+      setExercises(exercisesByGroup[muscleGroup]);
+      setCurrentVideoIndex(0);
+      return;
+    }
     setLoading(true);
     try {
       const response = await axios.get(`${BACKEND_URL}/api/exercises/by-muscle/${muscleGroup}`);
@@ -68,6 +128,7 @@ const Anatomy = () => {
   };
 
   const currentExercise = exercises[currentVideoIndex];
+  const nextExercise = exercises[currentVideoIndex + 1];
 
   return (
     <div className="min-h-screen" data-testid="anatomy-page">
@@ -221,8 +282,8 @@ const Anatomy = () => {
                       className="absolute inset-0"
                     >
                       <video
-                        src={currentExercise.video_url}
-                        poster={currentExercise.thumbnail}
+                        src={videoUrl(currentExercise)}
+                        poster={thumbnailUrl(currentExercise)}
                         controls
                         autoPlay
                         loop
@@ -232,6 +293,11 @@ const Anatomy = () => {
                     </motion.div>
                   </AnimatePresence>
 
+                  {/* Prefetch the next swipe video */}
+                  {hasAccess('video-swipe') && nextExercise && (
+                    <video src={videoUrl(nextExercise)} preload="auto" muted className="hidden" />
+                  )}
+
                   {/* Video Info Overlay */}
                   <div className="absolute bottom-0 left-0 right-0 bg-gradient-to-t from-black via-black/70 to-transparent p-6">
                     <h3 className="text-2xl font-bold text-white mb-2" data-testid="exercise-name">
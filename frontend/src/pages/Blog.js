@@ -7,19 +7,30 @@ import { Navbar } from '@/components/Navbar';
 import { Footer } from '@/components/Footer';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+const PAGE_SIZE = 20;
 
 const Blog = () => {
   const [posts, setPosts] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchPosts();
   }, []);
 
+  // The API pages its results; X-Next-Cursor is only sent while more posts remain
+  const fetchPage = async (cursor) => {
+    const response = await axios.get(`${BACKEND_URL}/api/blog/posts`, {
+      params: { limit: PAGE_SIZE, cursor },
+    });
+    setNextCursor(response.headers['x-next-cursor'] || null);
+    return response.data;
+  };
+
   const fetchPosts = async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/blog/posts`);
-      setPosts(response.data);
+      setPosts(await fetchPage());
     } catch (error) {
       console.error('Failed to fetch posts:', error);
     } finally {
@@ -27,6 +38,18 @@ const Blog = () => {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      setPosts((current) => [...current, ...page]);
+    } catch (error) {
+      console.error('Failed to fetch more posts:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   if (loading) {
     return (
       <div className="min-h-screen flex items-center justify-center">
@@ -62,7 +85,7 @@ const Blog = () => {
                 key={post.id}
                 initial={{ opacity: 0, y: 20 }}
                 animate={{ opacity: 1, y: 0 }}
-                transition={{ delay: index * 0.1 }}
+                transition={{ delay: (index % PAGE_SIZE) * 0.1 }}
                 className="dashboard-card group"
                 data-testid={`blog-card-${index}`}
               >
@@ -110,6 +133,20 @@ const Blog = () => {
               </motion.article>
             ))}
           </div>
+
+          {/* Load More */}
+          {nextCursor && (
+            <div className="mt-12 text-center">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                data-testid="load-more-button"
+                className="btn-primary disabled:opacity-50 disabled:cursor-not-allowed"
+              >
+                {loadingMore ? 'Yükleniyor...' : 'Daha Fazla Yükle'}
+              </button>
+            </div>
+          )}
         </div>
       </div>
 
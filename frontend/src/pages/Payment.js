@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useRef, useState } from 'react';
 import { useNavigate, useLocation, Navigate } from 'react-router-dom';
 import { useForm } from 'react-hook-form';
 import { zodResolver } from '@hookform/resolvers/zod';
@@ -19,12 +19,22 @@ const paymentSchema = z.object({
   cvv: z.string().length(3, 'CVV 3 haneli olmalı')
 });
 
+const POLL_INTERVAL_MS = 1000;
+const POLL_ATTEMPTS = 30;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
 const Payment = () => {
   const navigate = useNavigate();
   const location = useLocation();
-  const { updateSubscription } = useAuth();
+  const { user, login } = useAuth();
   const [isLoading, setIsLoading] = useState(false);
   const [success, setSuccess] = useState(false);
+  // One key per payment attempt, so double clicks and retries of an unsettled attempt are charged once
+  const idempotencyKey = useRef(crypto.randomUUID());
+  const rotateIdempotencyKey = () => {
+    idempotencyKey.current = crypto.randomUUID();
+  };
 
   const plan = location.state?.plan;
 
@@ -44,15 +54,43 @@ const Payment = () => {
     setIsLoading(true);
 
     try {
-      await axios.post(`${BACKEND_URL}/api/subscriptions/activate`, {
-        plan_name: plan.name,
-        card_number: data.card_number,
-        card_name: data.card_name,
-        expiry: data.expiry,
-        cvv: data.cvv
+      let { data: payment } = await axios.post(
+        `${BACKEND_URL}/api/subscriptions/activate`,
+        {
+          plan_name: plan.name,
+          card_number: data.card_number,
+          card_name: data.card_name,
+          expiry: data.expiry,
+          cvv: data.cvv
+        },
+        { headers: { 'Idempotency-Key': idempotencyKey.current } }
+      ).catch((error) => {
+        // A rejected request created no payment, so the key must not pin the next attempt to it;
+        // without a response the payment may exist, and resubmitting with the same key finds it
+        if (error.response) {
+          rotateIdempotencyKey();
+        }
+        throw error;
       });
 
-      updateSubscription(plan.name);
+      // Payment is processed in the background; wait for the outcome
+      for (let attempt = 0; ['pending', 'processing'].includes(payment.status) && attempt < POLL_ATTEMPTS; attempt++) {
+        await sleep(POLL_INTERVAL_MS);
+        ({ data: payment } = await axios.get(`${BACKEND_URL}/api/subscriptions/payments/${payment.payment_id}`));
+      }
+      if (payment.status === 'failed') {
+        // The server answers a reused key with this failure forever; a retry is a new payment
+        rotateIdempotencyKey();
+      }
+      if (payment.status !== 'succeeded') {
+        throw new Error(payment.message);
+      }
+
+      // Refresh the session so the access token carries the new plan
+      const { data: session } = await axios.post(`${BACKEND_URL}/api/auth/refresh`, {
+        refresh_token: user.refresh_token
+      });
+      login(session);
       setSuccess(true);
       toast.success('Aboneliğiniz aktif hale geldi!');
 
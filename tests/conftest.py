@@ -0,0 +1,89 @@
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+# server.py reads its settings at import time; the client connects lazily, so no server is needed
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "byklab_test")
+os.environ.setdefault("CHANGE_FEED_MODE", "poll")
+os.environ.setdefault("ADMIN_TOKEN", "test-admin-token")
+os.environ.setdefault("JWT_SECRET", "test-jwt-secret-of-at-least-32-bytes")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def app_client(monkeypatch):
+    """The full app, lifespan included, against a fresh in-memory mongomock database."""
+    from fastapi.testclient import TestClient
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+
+    monkeypatch.setattr(server, "AsyncIOMotorClient", AsyncMongoMockClient)
+    server.connect_mongo()
+    monkeypatch.setattr(server, "response_cache", server.ResponseCache(max_entries=1024, ttl=60))
+    monkeypatch.setattr(server, "recommendation_cache", server.ResponseCache(max_entries=1024, ttl=60))
+    monkeypatch.setattr(server.rate_limiter, "backend", server.MemoryRateLimitBackend())
+    # Shutting down the lifespan stops the pool's executor
+    monkeypatch.setattr(server, "password_pool", server.PasswordPool(workers=2, max_queue=64))
+    # Each TestClient runs its own event loop, and a queue stays bound to the first one that used it
+    monkeypatch.setattr(server.payment_processor, "queue", asyncio.Queue(maxsize=1000))
+    with TestClient(server.app) as client:
+        yield client
+
+
+@pytest.fixture
+def admin_headers():
+    return {"Authorization": f"Bearer {os.environ['ADMIN_TOKEN']}"}
+
+
+@pytest.fixture
+def seeded(app_client, admin_headers):
+    response = app_client.post("/api/seed-data", headers=admin_headers)
+    assert response.status_code == 200
+    return app_client
+
+
+@pytest.fixture
+def session(app_client):
+    """Signs up a user, optionally pays for a plan, and returns their auth headers."""
+
+    def create(email: str, plan: str = None) -> dict:
+        signup = app_client.post("/api/auth/signup", json={
+            "email": email, "password": "secret123", "full_name": "Test User"
+        })
+        assert signup.status_code == 200, signup.text
+        headers = {"Authorization": f"Bearer {signup.json()['access_token']}"}
+        if plan is None:
+            return headers
+
+        payment = app_client.post("/api/subscriptions/activate", headers={**headers, "Idempotency-Key": f"key-{email}"},
+                                  json={"plan_name": plan, "card_number": "4242 4242 4242 4242", "card_name": "Test User",
+                                        "expiry": "12/30", "cvv": "123"})
+        assert payment.status_code == 202, payment.text
+        wait_for_payment(app_client, headers, payment.json()["payment_id"], "succeeded")
+        # Entitlements travel in the token, so a new one picks up the plan
+        refreshed = app_client.post("/api/auth/refresh", json={"refresh_token": signup.json()["refresh_token"]})
+        return {"Authorization": f"Bearer {refreshed.json()['access_token']}"}
+
+    return create
+
+
+def wait_for_payment(client, headers: dict, payment_id: str, status: str, timeout: float = 5) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        payment = client.get(f"/api/subscriptions/payments/{payment_id}", headers=headers).json()
+        if payment["status"] == status or time.monotonic() > deadline:
+            assert payment["status"] == status, payment
+            return payment
+        time.sleep(0.05)
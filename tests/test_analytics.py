@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pandas as pd
+
+import analytics
+from server import MUSCLE_GROUPS, muscle_balance_score, rollup_id
+
+
+def test_balance_scores_match_the_server():
+    users = {
+        "empty": {},
+        "even": {group: 20 for group in MUSCLE_GROUPS},
+        "one": {"Kol": 45},
+        "skewed": {"Göğüs": 60, "Sırt": 30, "Bacak": 15, "Karın": 5},
+        "two": {"Omuz": 10, "Karın": 10},
+    }
+    minutes = pd.DataFrame.from_dict(users, orient="index").reindex(list(users)).fillna(0)
+    scores = analytics.balance_scores(minutes)
+    assert scores.to_dict() == {user: muscle_balance_score(muscles) for user, muscles in users.items()}
+
+
+def workout(user_id, muscle_group, minutes, days_ago):
+    return {"user_id": user_id, "muscle_group": muscle_group, "duration_minutes": minutes,
+            "performed_at": datetime.now(timezone.utc) - timedelta(days=days_ago)}
+
+
+def test_run_writes_one_rollup_per_active_user():
+    db = mongomock.MongoClient()["test"]
+    db.workouts.insert_many([workout("a", "Kol", 30, 1), workout("a", "Sırt", 30, 2), workout("b", "Bacak", 20, 3)])
+    report = analytics.run(db, window_days=28, weeks=8)
+    assert report["users"] == 2
+    doc = db.workout_rollups.find_one({"_id": rollup_id("a", "analytics")})
+    assert doc["muscle_minutes"]["Kol"] == 30
+    assert doc["muscle_balance"] == muscle_balance_score({"Kol": 30, "Sırt": 30})
+    assert len(doc["weekly_trend"]) == 8
+    assert sum(week["value"] for week in doc["weekly_trend"]) == 60
+
+
+def test_users_leaving_the_window_lose_their_rollup():
+    db = mongomock.MongoClient()["test"]
+    db.workouts.insert_many([workout("a", "Kol", 30, 1), workout("b", "Bacak", 20, 3)])
+    db.workout_rollups.insert_one({"_id": rollup_id("b", "2024-01-01"), "user_id": "b", "day": "2024-01-01"})
+    analytics.run(db, window_days=28, weeks=8)
+    # b's only workout is now older than both the window and the weekly trend
+    db.workouts.update_many({"user_id": "b"}, {"$set": {"performed_at": datetime.now(timezone.utc) - timedelta(days=90)}})
+
+    report = analytics.run(db, window_days=28, weeks=8)
+    assert (report["users"], report["removed"]) == (1, 1)
+    assert db.workout_rollups.find_one({"_id": rollup_id("b", "analytics")}) is None
+    assert db.workout_rollups.find_one({"_id": rollup_id("a", "analytics")}) is not None
+    # Daily rollups are not the job's to remove
+    assert db.workout_rollups.find_one({"_id": rollup_id("b", "2024-01-01")}) is not None
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+import server
+from server import ChangeBatch
+
+POST = {"id": "outside", "title": "Written elsewhere", "excerpt": "e", "content": "c",
+        "image": "https://images.unsplash.com/p", "author": "Ayşe", "published_at": "2024-01-01T00:00:00+00:00",
+        "read_time": "3 dk"}
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    # Set before the app starts: the poller reads it as it goes to sleep
+    monkeypatch.setattr(server, "CHANGE_FEED_POLL_INTERVAL", 0.02)
+
+
+def bump(collection: str):
+    # What another worker or a batch job does after writing
+    server.db.delegate.cache_versions.update_one({"_id": collection}, {"$inc": {"version": 1}}, upsert=True)
+
+
+def titles(client) -> list:
+    return [p["title"] for p in client.get("/api/blog/posts").json()]
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_polling_drops_caches_on_another_workers_bump(seeded):
+    before = titles(seeded)
+    server.db.delegate.blog_posts.insert_one(dict(POST))
+    assert titles(seeded) == before
+    bump("blog_posts")
+    wait_for(lambda: "Written elsewhere" in titles(seeded))
+
+
+def test_own_bump_is_applied_once(app_client, monkeypatch):
+    dropped = []
+    monkeypatch.setattr(server, "invalidate_caches", dropped.append)
+    app_client.portal.call(server.content_changed, "blog_posts")
+    batches = server.change_feed.batches
+    bump("exercises")
+    wait_for(lambda: server.change_feed.batches > batches)
+    assert dropped == ["blog_posts", "exercises"]
+
+
+def test_stream_publish_is_recorded_as_own(app_client, monkeypatch):
+    monkeypatch.setattr(server.change_feed, "mode", "stream")
+    monkeypatch.setattr(server.change_feed, "published", {})
+    app_client.portal.call(server.change_feed.publish, "exercises")
+    app_client.portal.call(server.change_feed.publish, "exercises")
+    assert server.change_feed.published == {"exercises": {1, 2}}
+
+
+def event(collection: str, key, **fields) -> dict:
+    return {"operationType": "update", "ns": {"coll": collection}, "documentKey": {"_id": key}, **fields}
+
+
+def version_event(collection: str, version: int) -> dict:
+    return event("cache_versions", collection, updateDescription={"updatedFields": {"version": version}})
+
+
+def test_own_bump_covers_the_writes_before_it():
+    own = {"exercises": {7}}
+    batch = ChangeBatch(own)
+    batch.add(event("exercises", "a"))
+    batch.add(event("blog_posts", "b"))
+    batch.add(version_event("exercises", 7))
+    assert batch.collections == {"blog_posts"}
+    assert own == {"exercises": set()}
+
+
+def test_writes_after_an_own_bump_still_count():
+    batch = ChangeBatch({"exercises": {7}})
+    batch.add(version_event("exercises", 7))
+    batch.add(event("exercises", "a"))
+    batch.add({"operationType": "insert", "ns": {"coll": "cache_versions"}, "documentKey": {"_id": "media_assets"},
+               "fullDocument": {"version": 1}})
+    assert batch.collections == {"exercises", "media_assets"}
+
+
+def test_another_workers_bump_is_applied():
+    batch = ChangeBatch({"exercises": {7}})
+    batch.add(version_event("exercises", 8))
+    assert batch.collections == {"exercises"}
@@ -0,0 +1,92 @@
+import zlib
+
+import brotli
+import pytest
+
+from server import CompressionMiddleware
+
+BODY = b'{"items":[' + b",".join(b'{"name":"Bench Press"}' for _ in range(200)) + b"]}"
+
+
+def app_sending(*chunks, content_type=b"application/json", status=200, headers=()):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type), *headers]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+
+async def call(app, accept_encoding):
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await CompressionMiddleware(app)(scope, None, send)
+    start, *bodies = messages
+    return dict((k.decode(), v.decode()) for k, v in start["headers"]), bodies
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0, gzip", "gzip"),
+    ("*", "br"),
+    ("identity", None),
+    ("", None),
+    ("br;q=oops, gzip;q=0.5", "gzip"),
+])
+def test_negotiate_prefers_brotli(accept_encoding, expected):
+    assert CompressionMiddleware(None).negotiate(accept_encoding) == expected
+
+
+@pytest.mark.anyio
+async def test_brotli_response_with_weak_etag():
+    headers, bodies = await call(app_sending(BODY, headers=[(b"etag", b'"abc"')]), "br")
+    assert headers["content-encoding"] == "br"
+    assert headers["vary"] == "Accept-Encoding"
+    assert headers["etag"] == 'W/"abc"'
+    assert int(headers["content-length"]) == len(bodies[0]["body"])
+    assert brotli.decompress(bodies[0]["body"]) == BODY
+
+
+@pytest.mark.anyio
+async def test_small_and_binary_bodies_pass_through():
+    headers, bodies = await call(app_sending(b"{}"), "gzip")
+    assert "content-encoding" not in headers
+    assert bodies[0]["body"] == b"{}"
+    headers, _ = await call(app_sending(BODY, content_type=b"image/png"), "gzip")
+    assert "content-encoding" not in headers
+
+
+@pytest.mark.anyio
+async def test_streams_are_flushed_chunk_by_chunk():
+    lines = [b'{"id":%d}\n' % i for i in range(3)]
+    headers, bodies = await call(app_sending(*lines, content_type=b"application/x-ndjson"), "gzip")
+    assert headers["content-encoding"] == "gzip"
+    assert "content-length" not in headers
+    decompressor = zlib.decompressobj(31)
+    # Each line can be decoded as soon as its chunk arrives
+    for line, message in zip(lines, bodies):
+        assert decompressor.decompress(message["body"]) == line
+    assert bodies[-1]["more_body"] is False
+    assert decompressor.eof
+
+
+@pytest.mark.parametrize("accept", ["application/json", "application/x-ndjson"])
+def test_both_list_formats_vary_on_accept(seeded, accept):
+    response = seeded.get("/api/blog/posts", params={"limit": 100},
+                          headers={"Accept": accept, "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(accept)
+    assert response.headers["content-encoding"] == "gzip"
+    assert [v.strip() for v in response.headers["vary"].split(",")] == ["Accept", "Accept-Encoding"]
+
+
+def test_not_modified_keeps_vary(seeded):
+    etag = seeded.get("/api/blog/posts").headers["etag"]
+    response = seeded.get("/api/blog/posts", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["vary"] == "Accept"
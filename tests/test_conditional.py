@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+# The test client asks for gzip by default; compressed bodies carry weak ETags
+IDENTITY = {"Accept-Encoding": "identity"}
+
+
+@pytest.mark.parametrize("path", ["/api/blog/posts", "/api/subscriptions/plans"])
+def test_matching_etag_is_not_modified(seeded, path):
+    first = seeded.get(path, headers=IDENTITY)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"].startswith("public, max-age=")
+
+    again = seeded.get(path, headers={**IDENTITY, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+
+
+def test_weak_and_listed_etags_match(seeded):
+    etag = seeded.get("/api/blog/posts", headers=IDENTITY).headers["etag"]
+    assert seeded.get("/api/blog/posts", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert seeded.get("/api/blog/posts", headers={"If-None-Match": "*"}).status_code == 304
+    assert seeded.get("/api/blog/posts", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_etag_changes_with_the_content(seeded, admin_headers):
+    post_id = seeded.get("/api/blog/posts", params={"limit": 1}).json()[0]["id"]
+    before = seeded.get(f"/api/blog/post/{post_id}")
+    post = {**before.json(), "title": "Changed"}
+    response = seeded.post("/api/import/blog_posts", headers=admin_headers,
+                           files={"file": ("post.ndjson", json.dumps(post) + "\n")})
+    assert response.status_code == 200, response.text
+
+    changed = seeded.get(f"/api/blog/post/{post_id}", headers={"If-None-Match": before.headers["etag"]})
+    assert changed.status_code == 200
+    assert changed.json()["title"] == "Changed"
+    assert changed.headers["etag"] != before.headers["etag"]
+
+
+def test_compressed_responses_get_a_weak_etag_that_still_matches(seeded):
+    response = seeded.get("/api/blog/posts", params={"limit": 100}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert etag.startswith("W/")
+    assert seeded.get("/api/blog/posts", params={"limit": 100},
+                      headers={"If-None-Match": etag, "Accept-Encoding": "gzip"}).status_code == 304
@@ -0,0 +1,67 @@
+import time
+
+import jwt
+import pytest
+
+import server
+
+GATED = ["/api/exercises", "/api/exercises/by-muscle/Göğüs", "/api/exercises/by-muscle?groups=Göğüs,Sırt",
+         "/api/media/videos/manifests"]
+
+
+@pytest.mark.parametrize("path", GATED + ["/api/dashboard/stats", "/api/recommendations"])
+def test_gated_endpoints_need_a_session(seeded, path):
+    response = seeded.get(path)
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
+
+
+@pytest.mark.parametrize("path", GATED)
+def test_free_plan_is_forbidden(seeded, session, path):
+    assert seeded.get(path, headers=session("free@example.com")).status_code == 403
+
+
+# mongomock has no $firstN, so the batch by-muscle endpoint is left out of the 200 case
+@pytest.mark.parametrize("path", GATED[:2])
+def test_paid_plan_gets_private_responses(seeded, session, path):
+    response = seeded.get(path, headers=session("paid@example.com", plan="Temel"))
+    assert response.status_code == 200
+    assert response.headers["cache-control"].startswith("private")
+
+
+def test_new_plan_takes_effect_on_refresh(seeded, session):
+    # Entitlements live in the token: the old one keeps its claims until it is refreshed
+    free = session("upgrade@example.com")
+    claims = jwt.decode(free["Authorization"][7:], options={"verify_signature": False})
+    server.db.delegate.users.update_one({"id": claims["sub"]}, {"$set": {"subscription_plan": "Temel"}})
+    assert seeded.get("/api/exercises", headers=free).status_code == 403
+    login = seeded.post("/api/auth/login", json={"email": "upgrade@example.com", "password": "secret123"})
+    assert seeded.get("/api/exercises", headers={"Authorization": f"Bearer {login.json()['access_token']}"}).status_code == 200
+
+
+def forged(claims: dict, secret: str = None) -> dict:
+    now = int(time.time())
+    token = jwt.encode({"type": "access", "sub": "u", "email": "x@example.com", "subscription_plan": "Kapsamlı",
+                        "has_anatomy": True, "has_video_swipe": True, "iat": now, "exp": now + 60, **claims},
+                       secret or server.JWT_SECRET, algorithm=server.JWT_ALGORITHM)
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.parametrize("headers", [
+    forged({}, secret="not-the-server-secret-but-32-bytes-long"),
+    forged({"exp": int(time.time()) - 10}),
+    forged({"type": "refresh"}),
+    {"Authorization": "Bearer not-a-jwt"},
+])
+def test_invalid_tokens_are_rejected(seeded, headers):
+    assert seeded.get("/api/exercises", headers=headers).status_code == 401
+
+
+def test_search_hides_exercises_without_the_feature(seeded, session):
+    free = session("searcher@example.com")
+    assert seeded.get("/api/search", params={"q": "press", "type": "exercise"}, headers=free).status_code == 403
+    results = seeded.get("/api/search", params={"q": "a"}, headers=free).json()["results"]
+    assert {r["type"] for r in results} <= {"blog_post"}
+    paid = session("searcher-paid@example.com", plan="Temel")
+    results = seeded.get("/api/search", params={"q": "press", "type": "exercise"}, headers=paid).json()["results"]
+    assert results and {r["type"] for r in results} == {"exercise"}
@@ -0,0 +1,81 @@
+import argparse
+import json
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import import_data
+import server
+
+POSTS = [
+    {"title": f"Post {i}", "excerpt": "e", "content": "c", "image": "https://images.unsplash.com/p",
+     "author": "Ayşe", "published_at": f"2024-01-0{i}T00:00:00+00:00", "read_time": "3 dk"}
+    for i in range(1, 4)
+]
+
+
+def ndjson(records) -> str:
+    return "".join(json.dumps(r) + "\n" for r in records)
+
+
+def upload(client, headers, records, **params):
+    response = client.post("/api/import/blog_posts", headers=headers, params=params,
+                           files={"file": ("posts.ndjson", ndjson(records))})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_reimport_keeps_ids_and_changes_nothing(app_client, admin_headers):
+    first = upload(app_client, admin_headers, POSTS)
+    ids = sorted(p["id"] for p in app_client.get("/api/blog/posts").json())
+    second = upload(app_client, admin_headers, POSTS)
+    assert (first["upserted"], second["upserted"], second["received"]) == (3, 0, 3)
+    assert sorted(p["id"] for p in app_client.get("/api/blog/posts").json()) == ids
+
+
+def test_seeding_twice_is_idempotent(seeded, admin_headers):
+    before = server.db.delegate.exercises.count_documents({})
+    reports = seeded.post("/api/seed-data", headers=admin_headers).json()["imports"]
+    assert server.db.delegate.exercises.count_documents({}) == before
+    assert all(r["upserted"] == 0 and r["pruned"] == 0 for r in reports)
+
+
+def test_prune_removes_what_the_file_no_longer_has(app_client, admin_headers):
+    upload(app_client, admin_headers, POSTS)
+    report = upload(app_client, admin_headers, POSTS[:2], prune="true")
+    assert report["pruned"] == 1
+    assert sorted(p["title"] for p in app_client.get("/api/blog/posts").json()) == ["Post 1", "Post 2"]
+
+
+def test_prune_is_skipped_when_a_record_is_invalid(app_client, admin_headers):
+    upload(app_client, admin_headers, POSTS)
+    report = upload(app_client, admin_headers, [POSTS[0], {"title": "No body"}], prune="true")
+    assert (report["invalid"], report["pruned"]) == (1, 0)
+    assert len(app_client.get("/api/blog/posts").json()) == 3
+
+
+def test_malformed_line_is_reported_and_the_rest_imported(app_client, admin_headers):
+    body = ndjson(POSTS[:1]) + '{"title": "Post 9",\n' + ndjson(POSTS[1:])
+    response = app_client.post("/api/import/blog_posts", headers=admin_headers,
+                               files={"file": ("posts.ndjson", body)})
+    assert response.status_code == 200, response.text
+    report = response.json()
+    assert (report["received"], report["upserted"], report["invalid"]) == (4, 3, 1)
+    assert report["errors"][0].startswith("record 2: malformed JSON")
+
+
+@pytest.mark.anyio
+async def test_cli_import_only_publishes_the_change(tmp_path, monkeypatch):
+    mongo = AsyncMongoMockClient()
+    monkeypatch.setattr(server, "client", mongo)
+    monkeypatch.setattr(server, "db", mongo["test"])
+    rebuilds = []
+    monkeypatch.setattr(server.search_service, "mark_stale", lambda: rebuilds.append(1))
+    path = tmp_path / "posts.ndjson"
+    path.write_text(ndjson(POSTS), encoding="utf-8")
+
+    args = argparse.Namespace(collection="blog_posts", path=str(path), batch_size=500, prune=False)
+    report = await import_data.run(args)
+    assert report["upserted"] == 3
+    assert rebuilds == []
+    assert (await server.db.cache_versions.find_one({"_id": "blog_posts"}))["version"] == 1
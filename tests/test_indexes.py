@@ -0,0 +1,35 @@
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import server
+
+
+def test_startup_builds_every_index(app_client):
+    report = app_client.app.state.index_report
+    assert all(not r["failed"] for r in report.values()), report
+    for collection, indexes in server.INDEXES.items():
+        existing = server.db.delegate[collection].index_information()
+        assert {i.document["name"] for i in indexes} <= set(existing), collection
+
+
+def test_ensure_indexes_skips_what_exists(app_client):
+    report = app_client.portal.call(server.ensure_indexes)
+    assert all(r == {"created": [], "failed": []} for r in report.values()), report
+
+
+@pytest.mark.parametrize("collection", ["users", "exercises", "blog_posts", "payments", "media_assets", "workouts"])
+def test_ids_are_unique(app_client, collection):
+    target = server.db.delegate[collection]
+    # Distinct emails, so on users it is id_unique and not email_unique that rejects the copy
+    target.insert_one({"id": "same", "email": "first@example.com"})
+    with pytest.raises(DuplicateKeyError):
+        target.insert_one({"id": "same", "email": "second@example.com"})
+
+
+def test_signup_with_a_taken_email_is_rejected(app_client):
+    user = {"email": "taken@example.com", "password": "secret123", "full_name": "Test User"}
+    assert app_client.post("/api/auth/signup", json=user).status_code == 200
+    second = app_client.post("/api/auth/signup", json={**user, "full_name": "Someone Else"})
+    assert second.status_code == 400
+    assert second.json()["detail"] == "Email already registered"
+    assert server.db.delegate.users.count_documents({"email": user["email"]}) == 1
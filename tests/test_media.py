@@ -0,0 +1,73 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from media import MediaStorage, best_fitting, smallest_covering
+
+IMAGES = [("thumb", 320, 180, 20_000), ("medium", 800, 450, 90_000), ("large", 1600, 900, 300_000)]
+VIDEOS = [("360p", 640, 360, 800), ("720p", 1280, 720, 2500), ("1080p", 1920, 1080, 5000)]
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="media")
+        for label, width, height, size in IMAGES:
+            s3.put_object(Bucket="media", Key=f"media/bench/{label}.webp", Body=b"x" * size,
+                          ContentType="image/webp",
+                          Metadata={"width": str(width), "height": str(height),
+                                    "source-url": "https://images.unsplash.com/bench"})
+        for label, width, height, kbps in VIDEOS:
+            s3.put_object(Bucket="media", Key=f"media/bench-video/{label}.mp4", Body=b"x" * kbps,
+                          ContentType="video/mp4",
+                          Metadata={"width": str(width), "height": str(height),
+                                    "bitrate-kbps": str(kbps), "duration": "42.5"})
+        yield MediaStorage("media", region="us-east-1")
+
+
+def test_scan_groups_renditions_by_asset(storage):
+    assets = storage.scan()
+    assert set(assets) == {"bench", "bench-video"}
+    images = assets["bench"]
+    assert images["source_url"] == "https://images.unsplash.com/bench"
+    assert [r["label"] for r in images["renditions"]] == ["thumb", "medium", "large"]
+    assert images["renditions"][0] == {
+        "label": "thumb", "key": "media/bench/thumb.webp", "content_type": "image/webp",
+        "width": 320, "height": 180, "bytes": 20_000, "bitrate_kbps": None,
+    }
+    assert assets["bench-video"]["duration_seconds"] == 42.5
+
+
+@pytest.mark.parametrize("width, expected", [(100, "thumb"), (320, "thumb"), (321, "medium"), (1200, "large"), (4000, "large")])
+def test_smallest_covering(storage, width, expected):
+    renditions = storage.scan()["bench"]["renditions"]
+    assert smallest_covering(renditions, width)["label"] == expected
+
+
+@pytest.mark.parametrize("max_height, bandwidth_kbps, expected", [
+    (None, None, "1080p"),
+    (720, None, "720p"),
+    (None, 4000, "720p"),
+    (1080, 3200, "720p"),
+    # 3000 kbps leaves too little headroom for the 2500 kbps rendition
+    (1080, 3000, "360p"),
+    (240, None, "360p"),
+    (None, 500, "360p"),
+])
+def test_best_fitting(storage, max_height, bandwidth_kbps, expected):
+    renditions = storage.scan()["bench-video"]["renditions"]
+    assert best_fitting(renditions, max_height, bandwidth_kbps)["label"] == expected
+
+
+def test_selection_of_nothing():
+    assert smallest_covering([], 320) is None
+    assert best_fitting([]) is None
+
+
+def test_presigned_urls_point_at_the_key(storage):
+    url = storage.presign("media/bench/thumb.webp")
+    assert "/media/bench/thumb.webp" in url
+    assert "X-Amz-Signature=" in url
@@ -0,0 +1,91 @@
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+from server import cursor_filter, encode_cursor, fetch_page
+
+SORT = [("published_at", -1), ("id", 1)]
+
+
+def test_cursor_filter_builds_keyset_condition():
+    cursor = encode_cursor({"published_at": 5, "id": "b"}, SORT)
+    assert cursor_filter(cursor, SORT) == {"$or": [
+        {"published_at": {"$lt": 5}},
+        {"published_at": 5, "id": {"$gt": "b"}},
+    ]}
+
+
+def raw_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    "e30=",
+    encode_cursor({"published_at": 1}, [("published_at", -1)]),
+    # Query operators smuggled in place of sort values
+    raw_cursor([{"$exists": True}, "zzz"]),
+    raw_cursor([5, {"$regex": "(a+)+$"}]),
+    raw_cursor([True, "b"]),
+    raw_cursor([None, "b"]),
+])
+def test_cursor_filter_rejects_malformed_cursors(cursor):
+    with pytest.raises(HTTPException) as exc:
+        cursor_filter(cursor, SORT)
+    assert exc.value.status_code == 400
+
+
+@pytest.fixture
+async def posts():
+    collection = AsyncMongoMockClient()["test"]["posts"]
+    # Ties on published_at make the id tie-breaker matter
+    await collection.insert_many(
+        [{"id": f"p{i:02d}", "published_at": i // 3, "title": f"Post {i}"} for i in range(10)]
+    )
+    return collection
+
+
+@pytest.mark.anyio
+async def test_fetch_page_walks_every_document_once(posts):
+    seen, cursor = [], None
+    while True:
+        docs, cursor = await fetch_page(posts, {}, SORT, ["id"], 4, cursor)
+        seen.extend(docs)
+        if cursor is None:
+            break
+    expected = sorted(
+        ({"id": f"p{i:02d}", "published_at": i // 3} for i in range(10)),
+        key=lambda d: (-d["published_at"], d["id"])
+    )
+    assert [d["id"] for d in seen] == [d["id"] for d in expected]
+
+
+@pytest.mark.anyio
+async def test_fetch_page_hides_sort_fields_not_requested(posts):
+    docs, cursor = await fetch_page(posts, {}, SORT, ["id", "title"], 2, None)
+    assert docs == [{"id": "p09", "title": "Post 9"}, {"id": "p06", "title": "Post 6"}]
+    assert cursor is not None
+
+
+@pytest.mark.anyio
+async def test_fetch_page_has_no_cursor_on_the_last_page(posts):
+    docs, cursor = await fetch_page(posts, {"published_at": 0}, SORT, ["id"], 3, None)
+    assert [d["id"] for d in docs] == ["p00", "p01", "p02"]
+    assert cursor is None
+
+
+def test_blog_posts_endpoint_pages_with_next_cursor(seeded):
+    first = seeded.get("/api/blog/posts", params={"limit": 2, "fields": "id,title"})
+    assert first.status_code == 200
+    assert all(set(post) == {"id", "title"} for post in first.json())
+    second = seeded.get("/api/blog/posts", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+    assert {p["id"] for p in first.json()}.isdisjoint(p["id"] for p in second.json())
+
+
+def test_injected_cursor_is_a_bad_request(seeded):
+    response = seeded.get("/api/blog/posts", params={"cursor": raw_cursor([{"$exists": True}, "zzz"])})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
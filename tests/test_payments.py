@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from tests.conftest import wait_for_payment
+
+CARD = {"card_number": "4242 4242 4242 4242", "card_name": "Test User", "expiry": "12/30", "cvv": "123"}
+
+
+def activate(client, headers, plan, key):
+    return client.post("/api/subscriptions/activate", headers={**headers, "Idempotency-Key": key},
+                       json={"plan_name": plan, **CARD})
+
+
+def test_repeated_key_returns_the_original_payment(app_client, session):
+    headers = session("repeat@example.com")
+    first = activate(app_client, headers, "Temel", "key-repeat-1")
+    second = activate(app_client, headers, "Temel", "key-repeat-1")
+    assert (first.status_code, second.status_code) == (202, 202)
+    assert first.json()["payment_id"] == second.json()["payment_id"]
+    wait_for_payment(app_client, headers, first.json()["payment_id"], "succeeded")
+    assert server.db.delegate.payments.count_documents({"idempotency_key": "key-repeat-1"}) == 1
+
+
+def test_key_reused_for_another_plan_conflicts(app_client, session):
+    headers = session("conflict@example.com")
+    assert activate(app_client, headers, "Temel", "key-conflict").status_code == 202
+    response = activate(app_client, headers, "Gelişmiş", "key-conflict")
+    assert response.status_code == 409
+
+
+def test_activation_requires_a_key_and_a_session(app_client, session):
+    headers = session("nokey@example.com")
+    assert app_client.post("/api/subscriptions/activate", headers=headers,
+                           json={"plan_name": "Temel", **CARD}).status_code == 422
+    assert activate(app_client, {}, "Temel", "key-anonymous").status_code == 401
+
+
+def test_declined_payment_is_final_for_its_key(app_client, session, monkeypatch):
+    class DecliningProvider:
+        async def charge(self, idempotency_key, amount, card_last4):
+            raise server.PaymentDeclined("Card declined")
+
+    headers = session("declined@example.com")
+    monkeypatch.setattr(server.payment_processor, "provider", DecliningProvider())
+    failed = activate(app_client, headers, "Temel", "key-declined-1").json()
+    wait_for_payment(app_client, headers, failed["payment_id"], "failed")
+    assert activate(app_client, headers, "Temel", "key-declined-1").json()["status"] == "failed"
+
+    # A new key is a new attempt
+    monkeypatch.setattr(server.payment_processor, "provider", server.MockPaymentProvider())
+    retry = activate(app_client, headers, "Temel", "key-declined-2").json()
+    assert retry["payment_id"] != failed["payment_id"]
+    wait_for_payment(app_client, headers, retry["payment_id"], "succeeded")
+
+
+def stored_payment(status: str, locked_for: float) -> server.Payment:
+    payment = server.Payment(user_id="lease-user", idempotency_key=f"key-{status}-{locked_for}",
+                             plan_name="Temel", amount=100, card_last4="4242", status=status)
+    doc = payment.model_dump()
+    doc["locked_until"] = datetime.now(timezone.utc) + timedelta(seconds=locked_for)
+    server.db.delegate.payments.insert_one(doc)
+    return payment
+
+
+@pytest.mark.parametrize("locked_for, expected", [
+    # The worker holding the lease died; its lease ran out, so another worker takes over
+    (-5, "succeeded"),
+    # Still leased by a live worker: left alone
+    (60, "processing"),
+])
+def test_processing_payments_are_recovered_once_their_lease_expires(app_client, locked_for, expected):
+    server.db.delegate.users.insert_one({"id": "lease-user", "email": "lease@example.com",
+                                         "subscription_plan": "Ücretsiz"})
+    payment = stored_payment("processing", locked_for)
+    app_client.portal.call(server.payment_processor.process, payment.id)
+    assert server.db.delegate.payments.find_one({"id": payment.id})["status"] == expected
+    plan = server.db.delegate.users.find_one({"id": "lease-user"})["subscription_plan"]
+    assert plan == ("Temel" if expected == "succeeded" else "Ücretsiz")
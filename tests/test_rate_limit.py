@@ -0,0 +1,54 @@
+import pytest
+
+from server import MemoryRateLimitBackend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("server.time.monotonic", lambda: now[0])
+    return now
+
+
+@pytest.mark.anyio
+async def test_bucket_allows_a_burst_then_asks_to_wait(clock):
+    backend = MemoryRateLimitBackend()
+    for _ in range(5):
+        assert await backend.take("ip", 5, 60) == 0.0
+    # One token refills every 12 seconds
+    assert await backend.take("ip", 5, 60) == pytest.approx(12.0)
+
+
+@pytest.mark.anyio
+async def test_bucket_refills_over_time(clock):
+    backend = MemoryRateLimitBackend()
+    for _ in range(5):
+        await backend.take("ip", 5, 60)
+    clock[0] += 6
+    assert await backend.take("ip", 5, 60) == pytest.approx(6.0)
+    clock[0] += 6
+    assert await backend.take("ip", 5, 60) == 0.0
+    # Refills never exceed capacity
+    clock[0] += 3600
+    for _ in range(5):
+        assert await backend.take("ip", 5, 60) == 0.0
+    assert await backend.take("ip", 5, 60) > 0
+
+
+@pytest.mark.anyio
+async def test_least_recently_used_keys_are_dropped(clock):
+    backend = MemoryRateLimitBackend(max_keys=2)
+    await backend.take("a", 1, 60)
+    await backend.take("b", 1, 60)
+    await backend.take("c", 1, 60)
+    # "a" was dropped, so it starts again with a full bucket
+    assert await backend.take("a", 1, 60) == 0.0
+    assert await backend.take("c", 1, 60) > 0
+
+
+def test_login_attempts_per_email_are_limited(app_client, session):
+    session("limited@example.com")
+    credentials = {"email": "limited@example.com", "password": "wrong-password"}
+    statuses = [app_client.post("/api/auth/login", json=credentials).status_code for _ in range(6)]
+    assert statuses == [401] * 5 + [429]
+    assert int(app_client.post("/api/auth/login", json=credentials).headers["Retry-After"]) > 0
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import recommendations
+import server
+from server import DEFAULT_RECOMMENDATIONS_ID, rerank
+
+
+def candidate(exercise_id, muscle_group, score):
+    return {"exercise_id": exercise_id, "muscle_group": muscle_group, "score": score}
+
+
+def test_rerank_sinks_recent_exercises_and_groups():
+    candidates = [candidate("a", "Göğüs", 1.0), candidate("b", "Sırt", 0.9), candidate("c", "Bacak", 0.7)]
+    recent = [{"exercise_id": "a", "muscle_group": "Göğüs"}, {"exercise_id": "x", "muscle_group": "Sırt"}]
+    ranked = rerank(candidates, recent, 3)
+    assert [c["exercise_id"] for c in ranked] == ["b", "c", "a"]
+    assert ranked[0]["score"] == pytest.approx(0.72)
+    assert ranked[2]["score"] == pytest.approx(0.4)
+    # Candidates are copied, not rescored in place
+    assert candidates[0]["score"] == 1.0
+
+
+def test_rerank_caps_each_group_at_a_third():
+    candidates = [candidate(f"g{i}", "Göğüs", 1.0 - i / 100) for i in range(5)] + [candidate("s", "Sırt", 0.1)]
+    ranked = rerank(candidates, [], 6)
+    assert [c["exercise_id"] for c in ranked] == ["g0", "g1", "s", "g2", "g3", "g4"]
+
+
+def test_rerank_fills_up_from_overflow():
+    candidates = [candidate(f"g{i}", "Göğüs", 1.0 - i / 100) for i in range(4)]
+    assert [c["exercise_id"] for c in rerank(candidates, [], 3)] == ["g0", "g1", "g2"]
+
+
+def test_users_leaving_the_window_fall_back_to_the_default_list(seeded, session):
+    headers = session("recs@example.com", plan="Kapsamlı")
+    exercise = seeded.get("/api/exercises", headers=headers, params={"limit": 1}).json()[0]
+    logged = seeded.post("/api/workouts", headers=headers, json={
+        "exercise_id": exercise["id"], "muscle_group": exercise["muscle_group"],
+        "duration_minutes": 45, "calories": 300,
+        "performed_at": (datetime.now(timezone.utc) - timedelta(days=1)).isoformat(),
+    })
+    user_id = logged.json()["user_id"]
+    mongo = server.db.delegate
+
+    recommendations.run(mongo, window_days=28)
+    personal = mongo.recommendations.find_one({"_id": user_id})
+    assert personal is not None
+    assert personal["gaps"] != mongo.recommendations.find_one({"_id": DEFAULT_RECOMMENDATIONS_ID})["gaps"]
+
+    mongo.workouts.update_many({"user_id": user_id},
+                               {"$set": {"performed_at": datetime.now(timezone.utc) - timedelta(days=60)}})
+    report = recommendations.run(mongo, window_days=28)
+    assert report["removed"] == 1
+    assert mongo.recommendations.find_one({"_id": user_id}) is None
+    # What the change feed does on the cache_versions bump
+    server.invalidate_caches("recommendations")
+
+    default = mongo.recommendations.find_one({"_id": DEFAULT_RECOMMENDATIONS_ID})
+    response = seeded.get("/api/recommendations", headers=headers, params={"limit": 5})
+    assert response.status_code == 200
+    assert [r["exercise"]["id"] for r in response.json()] == [c["exercise_id"] for c in rerank(default["candidates"], [], 5)]
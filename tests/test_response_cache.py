@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from server import ResponseCache
+
+
+def test_lru_eviction_keeps_recently_used_entries():
+    cache = ResponseCache(max_entries=2, ttl=60)
+    cache.set("a", ["exercises"], 1)
+    cache.set("b", ["exercises"], 2)
+    assert cache.get("a") == 1
+    cache.set("c", ["exercises"], 3)
+    assert cache.get("b") is ResponseCache._MISSING
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_expired_entries_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("server.time.monotonic", lambda: now[0])
+    cache = ResponseCache(max_entries=10, ttl=5)
+    cache.set("a", ["exercises"], 1)
+    now[0] += 6
+    assert cache.get("a") is ResponseCache._MISSING
+    assert cache.expirations == 1
+
+
+def test_invalidate_drops_only_tagged_entries():
+    cache = ResponseCache(max_entries=10, ttl=60)
+    cache.set("exercises", ["exercises"], 1)
+    cache.set("search", ["exercises", "blog_posts"], 2)
+    cache.set("posts", ["blog_posts"], 3)
+    cache.invalidate("exercises")
+    assert cache.get("exercises") is ResponseCache._MISSING
+    assert cache.get("search") is ResponseCache._MISSING
+    assert cache.get("posts") == 3
+
+
+@pytest.mark.anyio
+async def test_get_or_load_loads_once():
+    cache = ResponseCache(max_entries=10, ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return "value"
+
+    assert await cache.get_or_load("k", ["exercises"], loader) == "value"
+    assert await cache.get_or_load("k", ["exercises"], loader) == "value"
+    assert len(calls) == 1
+
+
+@pytest.mark.anyio
+async def test_load_racing_a_write_is_not_stored():
+    cache = ResponseCache(max_entries=10, ttl=60)
+
+    async def loader():
+        # A write lands while the old data is being read
+        cache.invalidate("exercises")
+        return "stale"
+
+    assert await cache.get_or_load("k", ["exercises"], loader) == "stale"
+    assert cache.get("k") is ResponseCache._MISSING
+
+
+def test_import_invalidates_cached_blog_posts(seeded, admin_headers):
+    before = seeded.get("/api/blog/posts", params={"limit": 100}).json()
+    post = {**before[0], "title": "Updated title", "content": "c", "excerpt": "e", "published_at": "2030-01-01T00:00:00+00:00"}
+    response = seeded.post("/api/import/blog_posts", headers=admin_headers,
+                           files={"file": ("posts.json", json.dumps([post]), "application/json")})
+    assert response.status_code == 200, response.text
+    after = seeded.get("/api/blog/posts", params={"limit": 100}).json()
+    assert after[0]["title"] == "Updated title"
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from server import RollupRepair, Workout, apply_rollups, rollup_id
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(server, "db", db)
+    return db
+
+
+def test_naive_performed_at_is_utc():
+    workout = Workout(user_id="u", muscle_group="Kol", duration_minutes=30, calories=100,
+                      performed_at=datetime(2024, 3, 1, 23, 30))
+    assert workout.performed_at == datetime(2024, 3, 1, 23, 30, tzinfo=timezone.utc)
+    assert server.rollup_updates(workout)[1]._filter["_id"] == rollup_id("u", "2024-03-01")
+
+
+@pytest.mark.anyio
+async def test_applying_a_workout_twice_counts_it_once(db):
+    workout = Workout(user_id="u", muscle_group="Kol", duration_minutes=30, calories=100)
+    await db.workouts.insert_one({**workout.model_dump(), "rollup_pending": datetime.now(timezone.utc)})
+    await apply_rollups(workout)
+    await apply_rollups(workout)
+    total = await db.workout_rollups.find_one({"_id": rollup_id("u", "total")})
+    assert (total["workouts"], total["duration_minutes"], total["muscles"]) == (1, 30, {"Kol": 30})
+    assert await db.workouts.count_documents({"rollup_pending": {"$exists": True}}) == 0
+
+
+@pytest.mark.anyio
+async def test_repair_applies_workouts_left_pending(db):
+    now = datetime.now(timezone.utc)
+    stale = Workout(user_id="u", muscle_group="Sırt", duration_minutes=20, calories=50)
+    in_flight = Workout(user_id="u", muscle_group="Kol", duration_minutes=10, calories=20)
+    await db.workouts.insert_one({**stale.model_dump(), "rollup_pending": now - timedelta(minutes=5)})
+    await db.workouts.insert_one({**in_flight.model_dump(), "rollup_pending": now})
+
+    assert await RollupRepair(lease_seconds=60).repair() == 1
+    total = await db.workout_rollups.find_one({"_id": rollup_id("u", "total")})
+    assert total["muscles"] == {"Sırt": 20}
+    # Recent markers belong to requests still writing their rollups
+    assert await db.workouts.count_documents({"rollup_pending": {"$exists": True}}) == 1
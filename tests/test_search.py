@@ -0,0 +1,66 @@
+from search import SearchIndex, fold, tokenize
+
+EXERCISES = [
+    {"id": "e1", "name": "Bench Press", "muscle_group": "Göğüs", "difficulty": "Orta", "description": "Göğüs kaslarını çalıştırır"},
+    {"id": "e2", "name": "İncline Dumbbell Press", "muscle_group": "Göğüs", "difficulty": "İleri", "description": ""},
+    {"id": "e3", "name": "Squat", "muscle_group": "Bacak", "difficulty": "Orta", "description": "Bacak ve kalça"},
+]
+POSTS = [
+    {"id": "p1", "title": "Göğüs antrenmanı rehberi", "excerpt": "Press çeşitleri", "author": "Ayşe", "content": ""},
+]
+
+
+def build():
+    return SearchIndex([("exercise", e) for e in EXERCISES] + [("blog_post", p) for p in POSTS])
+
+
+def test_fold_is_turkish_aware_and_strips_diacritics():
+    assert fold("GÖĞÜS") == fold("Göğüs") == "gogus"
+    assert fold("İNCLİNE") == "incline"
+    assert fold("KARIN") == "karin"
+    assert tokenize("Sırt, Omuz!") == ["sirt", "omuz"]
+
+
+def test_search_matches_folded_queries():
+    index = build()
+    ids = {r["id"] for r in index.search("gogus")["results"]}
+    assert ids == {"e1", "e2", "p1"}
+
+
+def test_last_term_matches_as_prefix():
+    index = build()
+    assert [r["id"] for r in index.search("squ")["results"]] == ["e3"]
+    # Earlier terms must match whole tokens
+    assert index.search("squ press")["total"] == 0
+
+
+def test_facets_count_the_matching_documents():
+    index = build()
+    result = index.search("press")
+    assert result["facets"]["type"] == {"exercise": 2, "blog_post": 1}
+    assert result["facets"]["muscle_group"] == {"Göğüs": 2}
+    assert result["facets"]["difficulty"] == {"Orta": 1, "İleri": 1}
+
+
+def test_filters_fold_their_values():
+    index = build()
+    result = index.search("press", {"muscle_group": "GÖĞÜS", "difficulty": "ileri"})
+    assert [r["id"] for r in result["results"]] == ["e2"]
+    assert index.search("press", {"muscle_group": "Sırt"})["total"] == 0
+
+
+def test_pages_do_not_overlap():
+    index = SearchIndex(
+        ("exercise", {"id": f"e{i}", "name": "Press", "muscle_group": "Omuz"}) for i in range(7)
+    )
+    pages = [index.search("press", limit=3, offset=offset)["results"] for offset in (0, 3, 6)]
+    ids = [r["id"] for page in pages for r in page]
+    assert sorted(ids) == sorted(f"e{i}" for i in range(7))
+
+
+def test_search_endpoint_returns_blog_posts_to_anonymous_users(seeded):
+    response = seeded.get("/api/search", params={"q": "spor"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] > 0
+    assert {r["type"] for r in body["results"]} == {"blog_post"}